@@ -1,7 +1,19 @@
+import copy
+import hashlib
+import inspect
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
 import numpy as np
-from itertools import product
-from functools import partial
-from random import choices, choice
+from bisect import bisect, bisect_left
+from collections.abc import Mapping, MutableMapping
+from itertools import accumulate, product
+from functools import lru_cache, partial
+from operator import itemgetter
+from random import choices, choice, random
 from matplotlib import pyplot as plt
 
 
@@ -29,6 +41,121 @@ ALL_SYMMETRY_OP_INV = {
 }
 
 
+SYMMETRY_OP_NAMES = list(ALL_SYMMETRY_OP)
+
+# potências de 3 para codificar um tabuleiro como inteiro na base 3 (a primeira
+# casa é o dígito mais significativo, então ordenar os códigos é o mesmo que
+# ordenar as strings)
+POTENCIAS_3 = 3 ** np.arange(8, -1, -1)
+NUM_TABULEIROS = 3**9
+
+
+class TabelaCanonica:
+    """Tabela pré-computada com a forma canônica de todos os 3^9 tabuleiros.
+
+    Todas as tabelas são indexadas pelo código na base 3 do tabuleiro (veja
+    `Configuracao.codigo`), de modo que canonizar um tabuleiro vira uma simples
+    consulta em array em vez de rot90/flip a cada chamada.
+
+    Atributos:
+      tabuleiros:
+        Array (3^9, 9) com o tabuleiro (em vetor linha) de cada código.
+      canonico:
+        Código do tabuleiro canônico (o ID oficial) de cada código.
+      op:
+        Índice em `SYMMETRY_OP_NAMES` da operação que leva o tabuleiro ao seu
+        canônico.
+      perm:
+        Array (3^9, 9). `tabuleiro[perm[codigo]]` é o tabuleiro canônico, ou
+        seja, a casa `j` do canônico é a casa `perm[codigo, j]` do original.
+      perm_inv:
+        Array (3^9, 9). `canonico[perm_inv[codigo]]` volta para o tabuleiro
+        original.
+      mapa:
+        Array (3^9, 9) com o `symmetry_map` (em vetor linha) de cada código.
+      ids:
+        Lista com a string de cada código.
+    """
+
+    def __init__(self):
+        self.tabuleiros = np.array(
+            list(product([0, 1, 2], repeat=9)), dtype=np.int8
+        )
+        codigos = np.arange(NUM_TABULEIROS)
+
+        # cada operação de simetria é só uma permutação das 9 casas
+        grade = np.arange(9).reshape(3, 3)
+        self.perms_op = np.array(
+            [
+                ALL_SYMMETRY_OP[nome](grade).ravel()
+                for nome in SYMMETRY_OP_NAMES
+            ]
+        )
+        self.perms_op_inv = np.argsort(self.perms_op, axis=1)
+
+        # código de cada tabuleiro transformado por cada operação
+        codigos_op = np.stack(
+            [self.tabuleiros[:, p] @ POTENCIAS_3 for p in self.perms_op],
+            axis=1,
+        )
+
+        # argmin pega a primeira operação na ordem de ALL_SYMMETRY_OP, igual
+        # ao `get_symmetry_id`
+        self.op = np.argmin(codigos_op, axis=1).astype(np.int8)
+        self.canonico = codigos_op[codigos, self.op].astype(np.int32)
+        self.perm = self.perms_op[self.op].astype(np.int8)
+        self.perm_inv = self.perms_op_inv[self.op].astype(np.int8)
+        self.mapa = self._cria_mapas(codigos_op == codigos[:, None])
+        self.ids = ["".join(map(str, t)) for t in self.tabuleiros]
+        self._equivalentes = {}
+
+    def _cria_mapas(self, simetrico):
+        """Versão vetorizada do `Configuracao.symmetry_map`."""
+        op = {nome: i for i, nome in enumerate(SYMMETRY_OP_NAMES)}
+        mapa = np.tile(np.arange(1, 10, dtype=np.int8), (NUM_TABULEIROS, 1))
+
+        def copia(nome, destino, origem):
+            linhas = np.flatnonzero(simetrico[:, op[nome]])
+            mapa[np.ix_(linhas, destino)] = mapa[np.ix_(linhas, origem)]
+
+        copia("fliph", [6, 7, 8], [0, 1, 2])
+        copia("flipv", [2, 5, 8], [0, 3, 6])
+        copia("flipdp", [3, 6, 7], [1, 2, 5])
+        copia("flipds", [5, 8, 7], [1, 0, 3])
+
+        linhas = simetrico[:, op["rot90"]] | simetrico[:, op["rot270"]]
+        mapa[np.ix_(linhas, [0, 2, 6, 8])] = 1
+        mapa[np.ix_(linhas, [1, 3, 5, 7])] = 2
+
+        copia("rot180", [7, 5, 8, 6], [1, 3, 0, 2])
+
+        # jogadas proibidas tem número -1
+        mapa[self.tabuleiros > 0] = -1
+        return mapa
+
+    def equivalentes(self, codigo):
+        """Casas de cada jogada do `symmetry_map` do tabuleiro `codigo`.
+
+        Retorna uma lista indexada pelo número da jogada (1 a 9) com a tupla
+        de casas (no próprio tabuleiro) que representam aquela jogada. As
+        listas são criadas na primeira consulta e guardadas.
+        """
+        if codigo not in self._equivalentes:
+            mapa = self.mapa[codigo].tolist()
+            self._equivalentes[codigo] = [
+                tuple(i for i in range(9) if mapa[i] == casa)
+                for casa in range(10)
+            ]
+        return self._equivalentes[codigo]
+
+    def id_canonico(self, codigo):
+        """Retorna o ID oficial (string) do tabuleiro de código `codigo`."""
+        return self.ids[self.canonico[codigo]]
+
+
+TABELA = TabelaCanonica()
+
+
 def testa_simetrias():
     """Para testar se as operações são válidas. Se der print, tem algo errado."""
     for jogo in map(Configuracao, product([0, 1, 2], repeat=9)):
@@ -45,6 +172,28 @@ def testa_simetrias():
                 return
 
 
+def testa_tabela():
+    """Confere a `TABELA` contra as operações originais. Se der print, tem algo
+    errado."""
+    for codigo, jogo in enumerate(
+        map(Configuracao, product([0, 1, 2], repeat=9))
+    ):
+        simetrias = jogo.symmetry_dict()
+        id_ = sorted(simetrias.values())[0]
+        op_name = [name for name in simetrias if simetrias[name] == id_][0]
+        canonico = Configuracao(id_).config
+        volta = ALL_SYMMETRY_OP_INV[op_name](canonico).ravel()
+        if (
+            jogo.get_symmetry_id() != id_
+            or jogo.op_name != op_name
+            or not np.all(canonico.ravel()[TABELA.perm_inv[codigo]] == volta)
+            or not np.all(jogo.symmetry_map() == jogo.symmetry_map_lento())
+        ):
+            print(jogo)
+            print(id_, op_name)
+            return
+
+
 class Configuracao:
     """Classe para representar uma configuração do jogo da velha.
 
@@ -93,19 +242,23 @@ class Configuracao:
             self.symmetries = symmetries
         return self.symmetries
 
+    def codigo(self):
+        """Código inteiro da config. na base 3, usado para indexar `TABELA`."""
+        return int(self.config.ravel() @ POTENCIAS_3)
+
     def get_symmetry_id(self):
         """O ID oficial da config. é a string da primeira posição do sorted."""
-        self.symmetry_dict()
-        self.id_ = sorted(self.symmetries.values())[0]
-        self.op_name = [
-            name
-            for name in self.symmetries
-            if self.symmetries[name] == self.id_
-        ][0]
+        codigo = self.codigo()
+        self.id_ = TABELA.id_canonico(codigo)
+        self.op_name = SYMMETRY_OP_NAMES[TABELA.op[codigo]]
         return self.id_
 
     def symmetry_map(self):
         """Computa o mapa de simetria. Números iguais representam mesma jogada."""
+        return TABELA.mapa[self.codigo()].reshape(3, 3).astype(int)
+
+    def symmetry_map_lento(self):
+        """Versão original do `symmetry_map`, usada para conferir a `TABELA`."""
         self.symmetry_dict()
         mapa = (np.arange(9) + 1).reshape(3, 3)
 
@@ -197,252 +350,2996 @@ class Configuracao:
             return False
 
 
-class Jogador:
-    """Cria um agente jogador de jogo da velha.
+# máscaras de 9 bits (bit i = casa i) das 3 linhas, 3 colunas e 2 diagonais
+LINHAS_VITORIA = [
+    0b000000111,
+    0b000111000,
+    0b111000000,
+    0b001001001,
+    0b010010010,
+    0b100100100,
+    0b100010001,
+    0b001010100,
+]
+
+# tabelas indexadas pela máscara de 9 bits de um jogador
+VITORIA_MASCARA = [
+    any(mascara & linha == linha for linha in LINHAS_VITORIA)
+    for mascara in range(512)
+]
+NUM_PECAS_MASCARA = [bin(mascara).count("1") for mascara in range(512)]
+BASE3_MASCARA = [
+    sum(int(POTENCIAS_3[i]) for i in range(9) if mascara >> i & 1)
+    for mascara in range(512)
+]
+CASAS_MASCARA = [
+    [i for i in range(9) if mascara >> i & 1] for mascara in range(512)
+]
+
+
+class ConfiguracaoBits:
+    """Representação compacta de uma configuração do jogo da velha.
+
+    Guarda só duas máscaras de 9 bits, uma por jogador (bit i = casa i, na
+    mesma ordem da string). Checar vitória é uma consulta em tabela, sem NumPy,
+    então é a representação usada na `simulacao`.
 
     Args:
-      player_num : int
-        Valor 1 representa jogador que faz primeiro movimento e valor 2
-        representa o outro jogador.
-      valor_inicial : int
-        Quantidade de missangas de cada cor distribuidas inicialmente nas caixas
-        de fósforo.
-      reforco_vitoria : int
-        Quantidade de missangas adicionadas quando se ganha.
-      reforco_derrota : int
-        Quantidade de missangas adicionadas quando se perde.
-      reforco_empate : int
-        Quantidade de missangas adicionadas quando se empata.
+      representacao:
+        String da configuração (como em `Configuracao`), instância de
+        `Configuracao` ou qualquer sequência (lista, tupla, array 3x3 ou em
+        vetor linha) com as 9 casas. Para criar a partir das duas máscaras,
+        use `ConfiguracaoBits.de_mascaras`.
     """
 
-    def __init__(
-        self,
-        player_num=1,
-        valor_inicial=8,
-        reforco_vitoria=3,
-        reforco_derrota=-1,
-        reforco_empate=0,
-        decay_do_valor_inicial=2,
-    ):
-        assert valor_inicial > 0
-        self.player_num = player_num
-        self.valor_inicial = valor_inicial
-        self.decay_do_valor_inicial = decay_do_valor_inicial
-        self.cria_dicionario_jogadas()
-        self.reforco_vitoria = reforco_vitoria
-        self.reforco_derrota = reforco_derrota
-        self.reforco_empate = reforco_empate
-        self.jogadas = []
-        self.num_jogos = 0
+    __slots__ = ("mascaras",)
 
-    def cria_dicionario_jogadas(self):
-        """Cria dicionário de todas as jogadas possíveis do jogador.
+    def __init__(self, representacao="000000000"):
+        if isinstance(representacao, Configuracao):
+            representacao = representacao.config
+        if isinstance(representacao, np.ndarray):
+            representacao = representacao.ravel()
 
-        Lista apenas jogos onde mais de uma escolha pode ser feita.
+        msg = "Tua configuração deve ter 9 posições"
+        assert len(representacao) == 9, msg
+
+        mascara1 = mascara2 = 0
+        for i, valor in enumerate(representacao):
+            if int(valor) == 1:
+                mascara1 |= 1 << i
+            elif int(valor) == 2:
+                mascara2 |= 1 << i
+        self.mascaras = (mascara1, mascara2)
+
+    @classmethod
+    def de_mascaras(cls, mascara1, mascara2):
+        """Cria a configuração direto das máscaras de 9 bits dos jogadores."""
+        configuracao = cls.__new__(cls)
+        configuracao.mascaras = (mascara1, mascara2)
+        return configuracao
 
-        Condições:
-        + Jogador 1 é quem começa a jogar
-        + Jogos já ganhos não são listados
-        + jogos com apenas um movimento possível não são listados
-        + jogos sem um movimento possível não são listados
-        """
+    def __repr__(self):
+        return Configuracao(self.get_string()).__repr__()
+
+    def __eq__(self, outra):
+        return (
+            isinstance(outra, ConfiguracaoBits)
+            and self.mascaras == outra.mascaras
+        )
+
+    def __hash__(self):
+        return hash(self.mascaras)
+
+    def get_string(self):
+        """Representação em string, igual à usada em `Configuracao`."""
+        mascara1, mascara2 = self.mascaras
+        return "".join(
+            "1" if mascara1 >> i & 1 else "2" if mascara2 >> i & 1 else "0"
+            for i in range(9)
+        )
+
+    def para_configuracao(self):
+        """Converte para uma instância de `Configuracao`."""
+        return Configuracao(self.get_string())
+
+    def codigo(self):
+        """Código na base 3, o mesmo de `Configuracao.codigo`."""
+        mascara1, mascara2 = self.mascaras
+        return BASE3_MASCARA[mascara1] + 2 * BASE3_MASCARA[mascara2]
+
+    def get_symmetry_id(self):
+        """ID oficial da configuração (veja `Configuracao.get_symmetry_id`)."""
+        return TABELA.id_canonico(self.codigo())
 
-        if self.player_num == 1:
-            diff = 0
+    def vazias(self):
+        """Número de casas vazias."""
+        mascara1, mascara2 = self.mascaras
+        return 9 - NUM_PECAS_MASCARA[mascara1 | mascara2]
+
+    def check_vitoria(self, jogador):
+        """Checa se jogador ganhou."""
+        return VITORIA_MASCARA[self.mascaras[jogador - 1]]
+
+    def jogar(self, casa, jogador):
+        """Retorna uma nova configuração com `jogador` jogando em `casa`."""
+        mascara1, mascara2 = self.mascaras
+        if jogador == 1:
+            return ConfiguracaoBits.de_mascaras(mascara1 | 1 << casa, mascara2)
         else:
-            diff = 1
+            return ConfiguracaoBits.de_mascaras(mascara1, mascara2 | 1 << casa)
 
-        jogos = {
-            jogo.get_symmetry_id(): jogo.create_choice_dict(
-                self.valor_inicial, self.decay_do_valor_inicial
-            )
-            for jogo in map(Configuracao, product([0, 1, 2], repeat=9))
-            if jogo.lista.count(1) - jogo.lista.count(2) == diff
-            and not (jogo.check_vitoria(1) or jogo.check_vitoria(2))
-            and not jogo.lista.count(0) in [0, 1]
-        }
 
-        self.brain = jogos
+# linhas de vitória que passam por cada casa
+LINHAS_POR_CASA = [
+    [linha for linha in LINHAS_VITORIA if linha >> casa & 1]
+    for casa in range(9)
+]
 
-    def realizar_jogada(self, config, verbose=False, return_prob=False):
-        """Recebe uma configuração e retorna a configuração com jogada realizada.
+# valores de `EstadoJogo.resultado` (1 ou 2 é o jogador que ganhou)
+EM_ANDAMENTO = -1
+EMPATE = 0
+
+
+class EstadoJogo:
+    """Estado de uma partida, atualizado incrementalmente a cada jogada.
+
+    Guarda as máscaras de cada jogador (como `ConfiguracaoBits`), o código na
+    base 3, o número de casas vazias e o resultado da partida. Cada jogada só
+    atualiza esses valores e checa as linhas que passam pela casa jogada, em
+    vez de analisar o tabuleiro todo de novo.
+
+    Args:
+      representacao:
+        Qualquer coisa aceita por `ConfiguracaoBits`, ou uma instância dela.
+
+    Atributos:
+      resultado:
+        `EM_ANDAMENTO`, `EMPATE`, ou 1 ou 2 se esse jogador ganhou.
+      casas:
+        Casas jogadas desde a criação do estado, em ordem.
+    """
+
+    __slots__ = ("mascaras", "codigo", "vazias", "resultado", "casas")
+
+    def __init__(self, representacao="000000000"):
+        if not isinstance(representacao, ConfiguracaoBits):
+            representacao = ConfiguracaoBits(representacao)
+
+        self.mascaras = list(representacao.mascaras)
+        self.codigo = representacao.codigo()
+        self.vazias = representacao.vazias()
+        self.casas = []
+
+        if representacao.check_vitoria(1):
+            self.resultado = 1
+        elif representacao.check_vitoria(2):
+            self.resultado = 2
+        elif self.vazias == 0:
+            self.resultado = EMPATE
+        else:
+            self.resultado = EM_ANDAMENTO
+
+    def __repr__(self):
+        return Configuracao(self.get_string()).__repr__()
+
+    @property
+    def canonico(self):
+        """Código do tabuleiro canônico (veja `TabelaCanonica`)."""
+        return int(TABELA.canonico[self.codigo])
+
+    @property
+    def lista(self):
+        """Tabuleiro como lista de 9 inteiros, como `Configuracao.lista`."""
+        return [int(c) for c in TABELA.tabuleiros[self.codigo]]
+
+    def get_symmetry_id(self):
+        """ID oficial da configuração (veja `Configuracao.get_symmetry_id`)."""
+        return TABELA.ids[self.canonico]
+
+    def get_string(self):
+        """Representação em string, igual à usada em `Configuracao`."""
+        return TABELA.ids[self.codigo]
+
+    def para_bits(self):
+        """Configuração atual como `ConfiguracaoBits`."""
+        return ConfiguracaoBits.de_mascaras(*self.mascaras)
+
+    def terminou(self):
+        """`True` se alguém ganhou ou deu velha."""
+        return self.resultado != EM_ANDAMENTO
+
+    def jogar(self, casa, jogador):
+        """Faz `jogador` jogar em `casa` e atualiza o resultado (no lugar)."""
+        mascara = self.mascaras[jogador - 1] | 1 << casa
+        self.mascaras[jogador - 1] = mascara
+        self.codigo += jogador * int(POTENCIAS_3[casa])
+        self.vazias -= 1
+        self.casas.append(casa)
+
+        # só as linhas que passam pela última casa podem ter sido completadas
+        for linha in LINHAS_POR_CASA[casa]:
+            if mascara & linha == linha:
+                self.resultado = jogador
+                break
+        else:
+            if self.vazias == 0:
+                self.resultado = EMPATE
+
+        return self
+
+
+class Regras:
+    """Regras de um jogo da velha n x n onde vence quem fizer `k` em linha.
+
+    O jogo da velha comum é `Regras(3, 3)`. As 8 simetrias do quadrado (as
+    mesmas de `ALL_SYMMETRY_OP`) viram permutações das n x n casas, então
+    valem para qualquer tamanho de tabuleiro. Como não dá para tabelar todos
+    os 3^(n*n) tabuleiros (4x4 já são 43 milhões), a forma canônica é
+    calculada a cada consulta (veja `canoniza`), e o código na base 3 dela é
+    usado como chave das caixas (veja `CerebroEsparso`).
+
+    Args:
+      n:
+        Número de linhas (e de colunas) do tabuleiro.
+      k:
+        Número de peças em linha (horizontal, vertical ou diagonal) para
+        ganhar.
+    """
+
+    def __init__(self, n=3, k=3):
+        assert 1 <= k <= n, "k tem que estar entre 1 e n"
+        self.n = n
+        self.k = k
+        self.num_casas = n * n
+
+        grade = np.arange(self.num_casas).reshape(n, n)
+        self.perms = [
+            tuple(ALL_SYMMETRY_OP[nome](grade).ravel().tolist())
+            for nome in SYMMETRY_OP_NAMES
+        ]
+        self._aplica = [itemgetter(*perm) for perm in self.perms]
+
+        # máscaras (bit i = casa i) de todos os segmentos de k casas
+        linhas = []
+        for direcao in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+            for linha, coluna in product(range(n), repeat=2):
+                casas = [
+                    (linha + i * direcao[0], coluna + i * direcao[1])
+                    for i in range(k)
+                ]
+                if all(0 <= l < n and 0 <= c < n for l, c in casas):
+                    linhas.append(sum(1 << (l * n + c) for l, c in casas))
+        self.linhas_vitoria = sorted(set(linhas))
+        self.linhas_por_casa = [
+            [linha for linha in self.linhas_vitoria if linha >> casa & 1]
+            for casa in range(self.num_casas)
+        ]
+
+    def __repr__(self):
+        return f"Regras(n={self.n}, k={self.k})"
+
+    def __eq__(self, outras):
+        if not isinstance(outras, Regras):
+            return False
+        return (self.n, self.k) == (outras.n, outras.k)
+
+    def __hash__(self):
+        return hash((self.n, self.k))
+
+    def __reduce__(self):
+        return (Regras, (self.n, self.k))
+
+    def canoniza(self, celulas):
+        """Forma canônica de um tabuleiro.
 
         Args:
-          config:
-            Configuração atual do tabuleiro. Pode ser string ou instancia de
-            Configuracao.
-          verbose:
-            Se `True`, então printa informações da jogada. Para ser usado no
-            debug.
-          return_prob:
-            Se `True`, então além da jogada realizada, retorna um array com as
-            probabilidades que cada casa tinha de ser sorteada. Probabilidades
-            representadas em um número entre zero e um.
+          celulas:
+            Sequência com o caractere ("0", "1" ou "2") de cada casa.
 
-        Return:
-          Se `return_prob=False` então retorna uma instância de Configuração com
-          a jogada já realizada. Se `return_prob=True`, então retorna
-          adicionalmente um array com as probabilidade de cada casa ser jogada
-          (probabilidades antes da jogada ser realizada).
+        Returns:
+          Tupla com o código na base 3 do tabuleiro canônico (o menor entre
+          as 8 simetrias, como na `TabelaCanonica`), a lista de índices em
+          `perms` das simetrias que levam o tabuleiro ao canônico e o
+          tabuleiro canônico (tupla de caracteres). A casa `j` do canônico é
+          a casa `perms[op][j]` do original, para qualquer `op` da lista.
         """
+        transformados = [aplica(celulas) for aplica in self._aplica]
+        canonico = min(transformados)
+        ops = [op for op, t in enumerate(transformados) if t == canonico]
+        return int("".join(canonico), 3), ops, canonico
 
-        config = Configuracao(config) if isinstance(config, str) else config
-        id_ = config.get_symmetry_id()
+    def jogadas(self, canonico):
+        """Casas vazias que representam jogadas diferentes em um tabuleiro.
 
-        if id_.count("0") == 1:
-            # apenas uma jogada a ser feita, não temos escolha
-            array = config.desencolhe()
-            logic = array == 0
-            array[logic] = self.player_num
-            config_up = Configuracao(array)
+        Casas levadas uma na outra por uma simetria do próprio tabuleiro são
+        a mesma jogada, representada pela de menor índice (como os números
+        do `symmetry_map`).
+        """
+        _, ops, _ = self.canoniza(canonico)
+        return sorted(
+            {
+                min(self.perms[op][casa] for op in ops)
+                for casa, valor in enumerate(canonico)
+                if valor == "0"
+            }
+        )
+
+    def missangas(self, vazias, valor_inicial=8, decay=2):
+        """Missangas iniciais de cada jogada de uma caixa.
+
+        Como no `create_choice_dict`: a cada rodada de cada jogador o valor
+        inicial é dividido por `decay`, com no mínimo uma missanga.
+        """
+        rodada = (self.num_casas - vazias) // 2
+        return max(int(round(valor_inicial / decay**rodada)), 1)
 
-            if return_prob:
-                prob_cada_casa = np.zeros((3, 3))
-                prob_cada_casa[logic] = 1
-                return config_up, prob_cada_casa
-            else:
-                return config_up
 
+class EstadoTabuleiro:
+    """Estado de uma partida com quaisquer `Regras`, como o `EstadoJogo`.
+
+    Guarda o tabuleiro como lista de caracteres (para `Regras.canoniza`) e
+    as máscaras de cada jogador, e a cada jogada só checa as linhas de
+    vitória que passam pela casa jogada.
+
+    Args:
+      regras:
+        Instância de `Regras`.
+      representacao:
+        String ou sequência com o valor (0, 1 ou 2) de cada casa. Se for
+        `None`, o tabuleiro começa vazio.
+
+    Atributos:
+      resultado:
+        `EM_ANDAMENTO`, `EMPATE`, ou 1 ou 2 se esse jogador ganhou.
+      casas:
+        Casas jogadas desde a criação do estado, em ordem.
+    """
+
+    __slots__ = (
+        "regras",
+        "celulas",
+        "mascaras",
+        "vazias",
+        "resultado",
+        "casas",
+    )
+
+    def __init__(self, regras, representacao=None):
+        if representacao is None:
+            representacao = "0" * regras.num_casas
+        self.celulas = [str(int(valor)) for valor in representacao]
+        assert (
+            len(self.celulas) == regras.num_casas
+        ), f"Tua configuração deve ter {regras.num_casas} posições"
+
+        self.regras = regras
+        self.mascaras = [0, 0]
+        for casa, valor in enumerate(self.celulas):
+            if valor != "0":
+                self.mascaras[int(valor) - 1] |= 1 << casa
+        self.vazias = self.celulas.count("0")
+        self.casas = []
+
+        vitoria = [
+            any(m & linha == linha for linha in regras.linhas_vitoria)
+            for m in self.mascaras
+        ]
+        if vitoria[0]:
+            self.resultado = 1
+        elif vitoria[1]:
+            self.resultado = 2
+        elif self.vazias == 0:
+            self.resultado = EMPATE
         else:
-            dicionario = self.brain[id_]
-            posicoes = list(dicionario.keys())
-            chance = list(dicionario.values())
+            self.resultado = EM_ANDAMENTO
 
-            # escolhe jogada
-            casa_escolhida = choices(posicoes, weights=chance)[0]
+    def __repr__(self):
+        n = self.regras.n
+        return np.array(self.lista).reshape(n, n).__str__()
+
+    @property
+    def lista(self):
+        """Tabuleiro como lista de inteiros."""
+        return [int(valor) for valor in self.celulas]
+
+    def get_string(self):
+        """Representação em string, uma casa por caractere."""
+        return "".join(self.celulas)
+
+    def canoniza(self):
+        """Forma canônica do tabuleiro (veja `Regras.canoniza`)."""
+        return self.regras.canoniza(self.celulas)
+
+    def terminou(self):
+        """`True` se alguém ganhou ou deu velha."""
+        return self.resultado != EM_ANDAMENTO
+
+    def jogar(self, casa, jogador):
+        """Faz `jogador` jogar em `casa` e atualiza o resultado (no lugar)."""
+        mascara = self.mascaras[jogador - 1] | 1 << casa
+        self.mascaras[jogador - 1] = mascara
+        self.celulas[casa] = "1" if jogador == 1 else "2"
+        self.vazias -= 1
+        self.casas.append(casa)
+
+        for linha in self.regras.linhas_por_casa[casa]:
+            if mascara & linha == linha:
+                self.resultado = jogador
+                break
+        else:
+            if self.vazias == 0:
+                self.resultado = EMPATE
 
-            config_up = Configuracao(id_)
-            mapa = config_up.symmetry_map()
+        return self
 
-            if verbose:
-                print(config)
-                print(ALL_SYMMETRY_OP_INV[config.op_name](mapa))
-                print(casa_escolhida)
-                print(dicionario)
-                print(config.op_name)
-                print()
 
-            index = choice(np.where(mapa.ravel() == casa_escolhida)[0])
+class Amostrador:
+    """Somas acumuladas dos pesos de uma caixa, para sortear com pesos.
 
-            lista = config_up.lista.copy()
-            lista[index] = self.player_num
-            array = np.array(lista).reshape(3, 3)
-            array = ALL_SYMMETRY_OP_INV[config.op_name](array)
-            config_up = Configuracao(array)
+    Sortear é um `random()` e uma busca binária nas somas, sem criar listas
+    novas, e dá a mesma jogada que o `random.choices` com os mesmos pesos.
+    Mudar um peso refaz as somas a partir dele, o que com no máximo 9 pesos
+    é mais rápido que uma árvore.
+
+    Args:
+      pesos:
+        Sequência com o peso (número de missangas) de cada índice.
+      chaves:
+        Sequência opcional com o que `sorteia` devolve para cada índice; por
+        padrão, o próprio índice.
+    """
 
-            # registra jogo feito
-            self.jogadas.append([dicionario, casa_escolhida])
+    __slots__ = ("acumulados", "chaves")
 
-            if return_prob:
-                # computa as chances de cada casa ser jogada
-                prob_cada_casa = np.zeros(9)
+    def __init__(self, pesos, chaves=None):
+        self.acumulados = list(accumulate(pesos))
+        self.chaves = chaves
 
-                for i in range(9):
-                    pos = mapa.ravel()[i]
-                    prob_cada_casa[i] = dicionario[pos] if pos > 0 else 0
+    def reconstroi(self, pesos):
+        """Troca todos os pesos, reaproveitando a mesma lista."""
+        self.acumulados[:] = accumulate(pesos)
 
-                prob_cada_casa /= prob_cada_casa.sum()
-                prob_cada_casa = prob_cada_casa.reshape(3, 3)
-                prob_cada_casa = ALL_SYMMETRY_OP_INV[config.op_name](
-                    prob_cada_casa
-                )
+    def peso(self, indice):
+        """Peso de `indice` (começando em zero)."""
+        anterior = self.acumulados[indice - 1] if indice else 0
+        return self.acumulados[indice] - anterior
 
-                return config_up, prob_cada_casa
-            else:
-                return config_up
+    def soma(self, indice, delta):
+        """Soma `delta` no peso de `indice` (começando em zero)."""
+        acumulados = self.acumulados
+        for i in range(indice, len(acumulados)):
+            acumulados[i] += delta
 
-    def atualizar_vitoria(self):
-        """Atualiza os dicionários de escolha em caso de vitória."""
+    def total(self):
+        """Soma de todos os pesos."""
+        return self.acumulados[-1]
 
-        for dicionario, casa_escolhida in self.jogadas:
-            dicionario[casa_escolhida] += self.reforco_vitoria
+    def sorteia(self):
+        """Sorteia um índice (ou chave) com probabilidade proporcional ao peso."""
+        acumulados = self.acumulados
+        valor = random() * acumulados[-1]
+        indice = bisect(acumulados, valor)
+        if indice == len(acumulados):
+            # o arredondamento de random() * total pode dar o próprio total
+            indice = bisect_left(acumulados, valor)
+        return indice if self.chaves is None else self.chaves[indice]
 
-            if dicionario[casa_escolhida] < 0:
-                dicionario[casa_escolhida] = 0
 
-            # se uma caixa está sem missangas, temos que resetá-la
-            if sum(list(dicionario.values())) <= 0:
-                for k in dicionario:
-                    dicionario[k] = self.valor_inicial
+class Caixa(MutableMapping):
+    """Visão de uma caixa de fósforo de um `CerebroDenso` como dicionário.
 
-        self.jogadas = []
-        self.num_jogos += 1
+    Chaves são as jogadas (números do `symmetry_map`) e valores são o número
+    de missangas, exatamente como nas caixas do cérebro em dicionário.
+    """
 
-    def atualizar_derrota(self):
-        """Atualiza os dicionários de escolha em caso de derrota."""
+    __slots__ = ("cerebro", "linha")
 
-        for dicionario, casa_escolhida in self.jogadas:
-            dicionario[casa_escolhida] += self.reforco_derrota
+    def __init__(self, cerebro, linha):
+        self.cerebro = cerebro
+        self.linha = linha
 
-            if dicionario[casa_escolhida] < 0:
-                dicionario[casa_escolhida] = 0
+    def __getitem__(self, casa):
+        if (
+            not 1 <= casa <= self.cerebro.validas.shape[1]
+            or not self.cerebro.validas[self.linha, casa - 1]
+        ):
+            raise KeyError(casa)
+        return int(self.cerebro.contagens[self.linha, casa - 1])
 
-            # se uma caixa está sem missangas, temos que resetá-la
-            if sum(list(dicionario.values())) <= 0:
-                for k in dicionario:
-                    dicionario[k] = self.valor_inicial
+    def __setitem__(self, casa, valor):
+        if (
+            not 1 <= casa <= self.cerebro.validas.shape[1]
+            or not self.cerebro.validas[self.linha, casa - 1]
+        ):
+            raise KeyError(casa)
+        self.cerebro.altera(self.linha, casa - 1, valor)
 
-        self.jogadas = []
-        self.num_jogos += 1
+    def __delitem__(self, casa):
+        raise TypeError("Não dá para remover jogadas de uma caixa")
 
-    def atualizar_empate(self):
-        """Atualiza os dicionários de escolha em caso de empate."""
+    def __iter__(self):
+        return (
+            int(c) + 1
+            for c in np.flatnonzero(self.cerebro.validas[self.linha])
+        )
+
+    def __len__(self):
+        return int(self.cerebro.validas[self.linha].sum())
+
+    def __repr__(self):
+        return dict(self).__repr__()
+
+
+class CerebroDenso(Mapping):
+    """Cérebro com as missangas de todas as caixas em uma única matriz.
+
+    Cada linha é uma caixa de fósforo (uma configuração canônica) e cada coluna
+    uma das 9 jogadas do `symmetry_map` (coluna `casa - 1`). Para leitura ele
+    se comporta como o dicionário de dicionários do `Jogador`, então
+    `print(cerebro)` e `cerebro[id_][casa]` continuam funcionando.
+
+    Cada caixa tem também um `Amostrador` com as mesmas missangas, criado na
+    primeira vez que a caixa é sorteada e atualizado pelos reforços. Quem
+    alterar `contagens` diretamente deve chamar `sincroniza` depois.
+
+    Args:
+      ids:
+        Lista com o ID oficial de cada caixa, na ordem das linhas.
+      contagens:
+        Matriz (caixas, 9) com o número de missangas de cada jogada.
+      validas:
+        Matriz booleana (caixas, 9) dizendo quais jogadas existem na caixa.
+    """
+
+    def __init__(self, ids, contagens, validas):
+        self.ids = [str(id_) for id_ in ids]
+        self.indice = {id_: linha for linha, id_ in enumerate(self.ids)}
+        self.contagens = np.array(contagens, dtype=np.int64)
+        self.validas = np.array(validas, dtype=bool)
+        self.sincroniza()
+
+    def sincroniza(self):
+        """Descarta os amostradores, que serão recriados de `contagens`."""
+        self.amostradores = [None] * len(self.ids)
+
+    @classmethod
+    def de_dicionario(cls, brain):
+        """Cria um cérebro denso a partir do dicionário de dicionários."""
+        contagens = np.zeros((len(brain), 9), dtype=np.int64)
+        validas = np.zeros((len(brain), 9), dtype=bool)
+        for linha, dicionario in enumerate(brain.values()):
+            for casa, valor in dicionario.items():
+                contagens[linha, casa - 1] = valor
+                validas[linha, casa - 1] = True
+        return cls(brain.keys(), contagens, validas)
+
+    def para_dicionario(self):
+        """Converte de volta para o dicionário de dicionários."""
+        return {id_: dict(self[id_]) for id_ in self.ids}
+
+    def copia(self):
+        """Cópia independente do cérebro (só copia as matrizes)."""
+        return CerebroDenso(self.ids, self.contagens, self.validas)
+
+    def linha_por_codigo(self):
+        """Array que leva o código de um tabuleiro canônico à sua linha.
+
+        Códigos sem caixa (jogos terminados, com uma só jogada possível, ou do
+        outro jogador) têm linha -1.
+        """
+        if not hasattr(self, "_linha_por_codigo"):
+            linhas = np.full(NUM_TABULEIROS, -1, dtype=np.int32)
+            linhas[[int(id_, 3) for id_ in self.ids]] = np.arange(len(self))
+            self._linha_por_codigo = linhas
+        return self._linha_por_codigo
+
+    def __getitem__(self, id_):
+        return Caixa(self, self.indice[id_])
 
-        for dicionario, casa_escolhida in self.jogadas:
-            dicionario[casa_escolhida] += self.reforco_empate
+    def __contains__(self, id_):
+        return id_ in self.indice
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return self.para_dicionario().__repr__()
+
+    def amostrador(self, linha):
+        """`Amostrador` com as missangas da caixa `linha`."""
+        amostrador = self.amostradores[linha]
+        if amostrador is None:
+            amostrador = Amostrador(self.contagens[linha].tolist())
+            self.amostradores[linha] = amostrador
+        return amostrador
+
+    def sorteia(self, linha):
+        """Sorteia uma jogada (número do `symmetry_map`) da caixa `linha`."""
+        return self.amostrador(linha).sorteia() + 1
+
+    def altera(self, linha, coluna, valor):
+        """Muda o número de missangas de uma jogada."""
+        amostrador = self.amostradores[linha]
+        if amostrador is not None:
+            amostrador.soma(coluna, valor - int(self.contagens[linha, coluna]))
+        self.contagens[linha, coluna] = valor
+
+    def reforca(self, linhas, colunas, reforco, valor_inicial):
+        """Soma `reforco` nas jogadas (linhas, colunas) de uma vez só.
+
+        Jogadas ficam com no mínimo zero missangas e caixas que ficaram vazias
+        são reiniciadas com `valor_inicial` em todas as jogadas válidas.
+        `reforco` pode ser um número ou um array com um valor por jogada.
+        """
+        if len(linhas) <= 16 and isinstance(reforco, (int, float, np.number)):
+            # poucas jogadas (um jogo só): mais rápido sem NumPy
+            self._reforca_poucas(linhas, colunas, reforco, valor_inicial)
+            return
+
+        linhas = np.asarray(linhas, dtype=np.intp)
+        colunas = np.asarray(colunas, dtype=np.intp)
+        np.add.at(self.contagens, (linhas, colunas), reforco)
+        self.contagens[linhas, colunas] = np.maximum(
+            self.contagens[linhas, colunas], 0
+        )
 
-            if dicionario[casa_escolhida] < 0:
-                dicionario[casa_escolhida] = 0
+        # se uma caixa está sem missangas, temos que resetá-la
+        vazias = linhas[self.contagens[linhas].sum(axis=1) <= 0]
+        self.contagens[vazias] = np.where(
+            self.validas[vazias], valor_inicial, 0
+        )
+        if _PERFIL is not None:
+            _PERFIL.reinicios += len(set(vazias.tolist()))
+
+        # atualiza os amostradores das caixas mexidas
+        for linha in set(linhas.tolist()):
+            amostrador = self.amostradores[linha]
+            if amostrador is not None:
+                amostrador.reconstroi(self.contagens[linha].tolist())
+
+    def _reforca_poucas(self, linhas, colunas, reforco, valor_inicial):
+        """Mesmo que `reforca`, jogada a jogada, lendo as missangas dos
+        `Amostrador` (sem NumPy) e atualizando-os."""
+        amostradores = self.amostradores
+        for linha, coluna in zip(linhas, colunas):
+            amostrador = amostradores[linha] or self.amostrador(linha)
+            valor = amostrador.peso(coluna)
+            novo = max(valor + reforco, 0)
+            if novo != valor:
+                amostrador.soma(coluna, novo - valor)
+                self.contagens[linha, coluna] = novo
 
             # se uma caixa está sem missangas, temos que resetá-la
-            if sum(list(dicionario.values())) <= 0:
-                for k in dicionario:
-                    dicionario[k] = self.valor_inicial
+            if amostrador.total() <= 0:
+                self.contagens[linha] = np.where(
+                    self.validas[linha], valor_inicial, 0
+                )
+                if _PERFIL is not None:
+                    _PERFIL.reinicios += 1
+                amostrador.reconstroi(self.contagens[linha].tolist())
 
-        self.jogadas = []
-        self.num_jogos += 1
 
+class CerebroSobDemanda(dict):
+    """Cérebro que só cria cada caixa de fósforo quando ela é consultada.
 
-def simulacao(player1, player2, num_jogos=100):
-    jogadores = [player1, player2]
-    vitorias1 = [0]
-    vitorias2 = [0]
-    empates = [0]
+    É um dicionário de dicionários comum, mas uma caixa que ainda não existe
+    é criada na primeira consulta (`cerebro[id_]`) com as mesmas regras do
+    `create_choice_dict`. Assim a memória cresce só com as configurações que
+    realmente foram jogadas, e salvar o cérebro (com pickle) grava apenas as
+    caixas usadas. O pickle volta como `CerebroSobDemanda`, que continua
+    criando as caixas que faltam; para ter todas as caixas, use
+    `Jogador.para_denso` (ou salve com `salva_cerebro`, veja
+    `Jogador.de_denso`).
 
-    for _ in range(num_jogos):
-        config = Configuracao()
-        jogador_da_vez = False
+    Args:
+      valor_inicial, decay:
+        Mesmos argumentos do `create_choice_dict`.
+    """
 
-        while (
-            (not config.check_vitoria(1))
-            and (not config.check_vitoria(2))
-            and (config.get_symmetry_id().count("0") > 0)
-        ):
-            config = jogadores[jogador_da_vez].realizar_jogada(config, False)
-            jogador_da_vez = not jogador_da_vez
+    def __init__(self, valor_inicial=8, decay=2, caixas=()):
+        super().__init__(caixas)
+        self.valor_inicial = valor_inicial
+        self.decay = decay
+
+    def __missing__(self, id_):
+        caixa = Configuracao(id_).create_choice_dict(
+            self.valor_inicial, self.decay
+        )
+        self[id_] = caixa
+        return caixa
+
+    def __reduce__(self):
+        # só as caixas usadas são salvas; as outras são criadas de novo
+        return (
+            CerebroSobDemanda,
+            (self.valor_inicial, self.decay, dict(self)),
+        )
 
-        if config.check_vitoria(1):
-            jogadores[0].atualizar_vitoria()
-            jogadores[1].atualizar_derrota()
-            vitorias1.append(vitorias1[-1] + 1)
-            vitorias2.append(vitorias2[-1])
-            empates.append(empates[-1])
 
-        elif config.check_vitoria(2):
-            jogadores[1].atualizar_vitoria()
-            jogadores[0].atualizar_derrota()
-            vitorias2.append(vitorias2[-1] + 1)
-            vitorias1.append(vitorias1[-1])
-            empates.append(empates[-1])
+class CerebroEsparso(CerebroDenso):
+    """Cérebro para quaisquer `Regras`, com caixas criadas sob demanda.
 
-        else:
-            jogadores[1].atualizar_empate()
-            jogadores[0].atualizar_empate()
-            vitorias1.append(vitorias1[-1])
-            vitorias2.append(vitorias2[-1])
-            empates.append(empates[-1] + 1)
+    As caixas são linhas de matrizes como no `CerebroDenso` (uma coluna por
+    casa do tabuleiro canônico, coluna `casa - 1` para a jogada `casa`), mas
+    só são criadas quando o tabuleiro aparece pela primeira vez, e a chave de
+    cada uma é o código inteiro do tabuleiro canônico (veja
+    `Regras.canoniza`) em vez da string. As matrizes crescem dobrando de
+    tamanho; só as primeiras `len(cerebro)` linhas são usadas.
 
-    return player1, player2, vitorias1, vitorias2, empates
+    Args:
+      regras:
+        Instância de `Regras`.
+      valor_inicial, decay:
+        Mesmos argumentos do `create_choice_dict` (veja `Regras.missangas`).
+      codigos, contagens, validas:
+        Caixas já existentes (por exemplo, lidas de um arquivo): código,
+        missangas e jogadas válidas de cada uma.
+    """
+
+    def __init__(
+        self,
+        regras,
+        valor_inicial=8,
+        decay=2,
+        codigos=(),
+        contagens=None,
+        validas=None,
+    ):
+        self.regras = regras
+        self.valor_inicial = valor_inicial
+        self.decay = decay
+
+        self.num_caixas = len(codigos)
+        capacidade = max(self.num_caixas, 1024)
+        self.codigos = np.zeros(capacidade, dtype=np.int64)
+        self.contagens = np.zeros((capacidade, regras.num_casas), np.int32)
+        self.validas = np.zeros((capacidade, regras.num_casas), dtype=bool)
+        if self.num_caixas:
+            self.codigos[: self.num_caixas] = codigos
+            self.contagens[: self.num_caixas] = contagens
+            self.validas[: self.num_caixas] = validas
+        self.indice = {codigo: linha for linha, codigo in enumerate(self.ids)}
+        self.amostradores = [None] * capacidade
+
+    @property
+    def ids(self):
+        """Código do tabuleiro canônico de cada caixa, na ordem das linhas."""
+        return self.codigos[: self.num_caixas].tolist()
+
+    def __len__(self):
+        return self.num_caixas
+
+    def copia(self):
+        """Cópia independente do cérebro (só copia as matrizes)."""
+        n = self.num_caixas
+        return CerebroEsparso(
+            self.regras,
+            self.valor_inicial,
+            self.decay,
+            self.codigos[:n],
+            self.contagens[:n],
+            self.validas[:n],
+        )
+
+    def linha(self, codigo, canonico):
+        """Linha da caixa do tabuleiro canônico `canonico`, criando se faltar.
+
+        Args:
+          codigo, canonico:
+            Código e tabuleiro canônico, como devolvidos por
+            `Regras.canoniza`.
+        """
+        linha = self.indice.get(codigo)
+        if linha is not None:
+            return linha
+
+        linha = self.num_caixas
+        if linha == len(self.codigos):
+            self._cresce()
+        jogadas = self.regras.jogadas(canonico)
+        self.codigos[linha] = codigo
+        self.validas[linha, jogadas] = True
+        self.contagens[linha, jogadas] = self.regras.missangas(
+            canonico.count("0"), self.valor_inicial, self.decay
+        )
+        self.indice[codigo] = linha
+        self.num_caixas += 1
+        return linha
+
+    def _cresce(self):
+        """Dobra a capacidade das matrizes."""
+        capacidade = 2 * len(self.codigos)
+        for nome in ["codigos", "contagens", "validas"]:
+            antigo = getattr(self, nome)
+            novo = np.zeros((capacidade,) + antigo.shape[1:], antigo.dtype)
+            novo[: len(antigo)] = antigo
+            setattr(self, nome, novo)
+        self.amostradores.extend(
+            [None] * (capacidade - len(self.amostradores))
+        )
+
+    def sorteia(self, linha):
+        """Sorteia uma jogada (coluna + 1) da caixa `linha`.
+
+        Sem `Amostrador`: com caixas criadas aos milhões, guardar uma lista por
+        caixa custaria mais memória que as próprias missangas.
+        """
+        pesos = self.contagens[linha].tolist()
+        return choices(range(1, len(pesos) + 1), weights=pesos)[0]
+
+
+def enumera_estados(player_num, valor_inicial, decay):
+    """Cria dicionário de todas as jogadas possíveis de um jogador.
+
+    Lista apenas jogos onde mais de uma escolha pode ser feita.
+
+    Condições:
+    + Jogador 1 é quem começa a jogar
+    + Jogos já ganhos não são listados
+    + jogos com apenas um movimento possível não são listados
+    + jogos sem um movimento possível não são listados
+    """
+
+    if player_num == 1:
+        diff = 0
+    else:
+        diff = 1
+
+    jogos = {
+        jogo.get_symmetry_id(): jogo.create_choice_dict(valor_inicial, decay)
+        for jogo in map(Configuracao, product([0, 1, 2], repeat=9))
+        if jogo.lista.count(1) - jogo.lista.count(2) == diff
+        and not (jogo.check_vitoria(1) or jogo.check_vitoria(2))
+        and not jogo.lista.count(0) in [0, 1]
+    }
+
+    return jogos
+
+
+# Aumente a versão quando mudar as regras de um jeito que a assinatura do
+# código não perceba (por exemplo, regras em outro arquivo).
+VERSAO_CACHE = 1
+PASTA_CACHE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "assets", "cache"
+)
+
+
+@lru_cache(maxsize=None)
+def assinatura_regras():
+    """Hash das regras que definem a tabela de estados.
+
+    Junta a `VERSAO_CACHE` com o código-fonte das funções que decidem quais
+    estados existem e com quantas missangas começam, então qualquer mudança
+    nelas invalida o cache.
+    """
+    fontes = [str(VERSAO_CACHE)]
+    for objeto in [
+        enumera_estados,
+        TabelaCanonica,
+        Configuracao.create_choice_dict,
+        Configuracao.check_vitoria,
+        Configuracao.symmetry_map_lento,
+    ]:
+        try:
+            fontes.append(inspect.getsource(objeto))
+        except (OSError, TypeError):
+            fontes.append(objeto.__qualname__)
+    return hashlib.sha1("\n".join(fontes).encode()).hexdigest()[:16]
+
+
+def caminho_cache(player_num, valor_inicial, decay):
+    """Arquivo de cache da tabela de estados de um jogador."""
+    nome = (
+        f"estados_j{player_num}_v{valor_inicial}_d{decay}_"
+        f"{assinatura_regras()}.npz"
+    )
+    return os.path.join(PASTA_CACHE, nome)
+
+
+def carrega_estados(player_num, valor_inicial, decay, usar_cache=True):
+    """Tabela com as caixas iniciais de um jogador, como `CerebroDenso`.
+
+    Na primeira vez a tabela é gerada com `enumera_estados` e salva em
+    `PASTA_CACHE`; depois disso ela é só lida do disco. O nome do arquivo
+    inclui a `assinatura_regras`, então mudar as regras gera um cache novo.
+
+    Args:
+      player_num, valor_inicial, decay:
+        Mesmos argumentos do `Jogador`.
+      usar_cache:
+        Se `False`, sempre gera a tabela (e não mexe no cache).
+    """
+
+    caminho = caminho_cache(player_num, valor_inicial, decay)
+
+    if usar_cache and os.path.exists(caminho):
+        try:
+            with np.load(caminho) as arquivo:
+                return CerebroDenso(
+                    arquivo["ids"], arquivo["contagens"], arquivo["validas"]
+                )
+        except (OSError, ValueError, KeyError):
+            # cache corrompido, gera de novo
+            pass
+
+    estados = CerebroDenso.de_dicionario(
+        enumera_estados(player_num, valor_inicial, decay)
+    )
+
+    if usar_cache:
+        try:
+            os.makedirs(PASTA_CACHE, exist_ok=True)
+            # escreve em um arquivo temporário e renomeia, para que outro
+            # processo nunca leia um cache pela metade
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            with open(temporario, "wb") as handle:
+                np.savez(
+                    handle,
+                    ids=np.array(estados.ids),
+                    contagens=estados.contagens,
+                    validas=estados.validas,
+                )
+            os.replace(temporario, caminho)
+        except OSError:
+            pass
+
+    return estados
+
+
+class Jogador:
+    """Cria um agente jogador de jogo da velha.
+
+    Args:
+      player_num : int
+        Valor 1 representa jogador que faz primeiro movimento e valor 2
+        representa o outro jogador.
+      valor_inicial : int
+        Quantidade de missangas de cada cor distribuidas inicialmente nas caixas
+        de fósforo.
+      reforco_vitoria : int
+        Quantidade de missangas adicionadas quando se ganha.
+      reforco_derrota : int
+        Quantidade de missangas adicionadas quando se perde.
+      reforco_empate : int
+        Quantidade de missangas adicionadas quando se empata.
+      decay_do_valor_inicial : int
+        Taxa de perda de missangas iniciais a cada rodada.
+      cerebro : str
+        "dicionario" guarda as caixas em um dicionário de dicionários e
+        "denso" guarda todas as missangas em uma matriz (`CerebroDenso`).
+        "sob_demanda" só cria cada caixa quando ela é usada pela primeira vez
+        (`CerebroSobDemanda`). "esparso" é o cérebro das `regras`
+        (`CerebroEsparso`).
+      usar_cache : bool
+        Se `True`, lê a tabela de estados iniciais do cache em disco.
+      adiar : int
+        Número de jogos acumulados antes de aplicar os reforços. Com 1 (o
+        padrão) cada jogo é reforçado assim que termina.
+      regras : Regras
+        Tamanho do tabuleiro e da linha de vitória. Se for `None`, é o jogo
+        da velha 3x3 de sempre. Com `regras` o cérebro é sempre "esparso" e
+        o jogador joga em instâncias de `EstadoTabuleiro`.
+    """
+
+    def __init__(
+        self,
+        player_num=1,
+        valor_inicial=8,
+        reforco_vitoria=3,
+        reforco_derrota=-1,
+        reforco_empate=0,
+        decay_do_valor_inicial=2,
+        cerebro="dicionario",
+        usar_cache=True,
+        adiar=1,
+        regras=None,
+    ):
+        assert valor_inicial > 0
+        assert cerebro in ["dicionario", "denso", "sob_demanda", "esparso"]
+        if cerebro == "esparso" and regras is None:
+            regras = Regras()
+        if regras is not None:
+            cerebro = "esparso"
+        self.regras = regras
+        self.player_num = player_num
+        self.valor_inicial = valor_inicial
+        self.decay_do_valor_inicial = decay_do_valor_inicial
+        self.cerebro = cerebro
+        self.usar_cache = usar_cache
+        self.cria_dicionario_jogadas()
+        self.reforco_vitoria = reforco_vitoria
+        self.reforco_derrota = reforco_derrota
+        self.reforco_empate = reforco_empate
+        self.adiar = adiar
+        self.jogadas = []
+        self.pendentes = []
+        self.num_jogos = 0
+        self.amostradores = {}
+
+    def cria_dicionario_jogadas(self):
+        """Cria dicionário de todas as jogadas possíveis do jogador.
+
+        Lista apenas jogos onde mais de uma escolha pode ser feita (veja
+        `enumera_estados`). Se `usar_cache=True`, a tabela de estados é lida
+        do cache em disco (veja `carrega_estados`). Nos modos "sob_demanda"
+        e "esparso" não cria nenhuma caixa agora.
+        """
+
+        if self.cerebro == "sob_demanda":
+            self.brain = CerebroSobDemanda(
+                self.valor_inicial, self.decay_do_valor_inicial
+            )
+            return
+
+        if self.cerebro == "esparso":
+            self.brain = CerebroEsparso(
+                self.regras, self.valor_inicial, self.decay_do_valor_inicial
+            )
+            return
+
+        jogos = carrega_estados(
+            self.player_num,
+            self.valor_inicial,
+            self.decay_do_valor_inicial,
+            self.usar_cache,
+        )
+
+        if self.cerebro == "dicionario":
+            jogos = jogos.para_dicionario()
+
+        self.brain = jogos
+
+    def amostrador(self, id_, dicionario):
+        """`Amostrador` da caixa `id_` de um cérebro em dicionário.
+
+        É criado no primeiro sorteio da caixa e atualizado pelos reforços (o
+        `CerebroDenso` guarda os seus). Quem alterar as missangas de uma caixa
+        diretamente deve chamar `sincroniza` depois.
+        """
+        entrada = self.amostradores.get(id_)
+        if entrada is None or entrada[0] is not dicionario:
+            amostrador = Amostrador(dicionario.values(), tuple(dicionario))
+            entrada = self.amostradores[id_] = (dicionario, amostrador)
+        return entrada[1]
+
+    def sincroniza(self):
+        """Descarta os amostradores, que serão recriados das missangas."""
+        self.amostradores = {}
+        if isinstance(self.brain, CerebroDenso):
+            self.brain.sincroniza()
+
+    def para_denso(self):
+        """Troca o cérebro do jogador por um `CerebroDenso` equivalente.
+
+        Caixas que ainda não existem (no modo "sob_demanda") entram com as
+        missangas iniciais.
+        """
+
+        if isinstance(self.brain, CerebroDenso):
+            return self.brain
+
+        cerebro = carrega_estados(
+            self.player_num,
+            self.valor_inicial,
+            self.decay_do_valor_inicial,
+            self.usar_cache,
+        )
+        for id_, dicionario in self.brain.items():
+            cerebro[id_].update(dicionario)
+
+        self.brain = cerebro
+        self.cerebro = "denso"
+        return cerebro
+
+    def de_denso(self, cerebro):
+        """Troca o cérebro do jogador pelo `CerebroDenso` `cerebro`.
+
+        O inverso de `para_denso`: o cérebro é convertido para o tipo de
+        cérebro do jogador. `cerebro` pode ter só parte das caixas (por
+        exemplo, salvo de um cérebro "sob_demanda"): nos modos "denso" e
+        "dicionario" ele é completado com a tabela de estados do jogador, com
+        as missangas iniciais nas caixas que faltam (como em `para_denso`).
+        Caixas que não são deste jogador são ignoradas.
+        """
+
+        if self.cerebro == "esparso":
+            self.brain = cerebro
+            return
+
+        if self.cerebro == "sob_demanda":
+            self.brain = CerebroSobDemanda(
+                self.valor_inicial,
+                self.decay_do_valor_inicial,
+                cerebro.para_dicionario(),
+            )
+            return
+
+        completo = carrega_estados(
+            self.player_num,
+            self.valor_inicial,
+            self.decay_do_valor_inicial,
+            self.usar_cache,
+        )
+        if cerebro.ids != completo.ids:
+            comuns = [
+                (completo.indice[id_], linha)
+                for linha, id_ in enumerate(cerebro.ids)
+                if id_ in completo.indice
+            ]
+            if comuns:
+                destino, origem = map(list, zip(*comuns))
+                completo.contagens[destino] = cerebro.contagens[origem]
+            completo.sincroniza()
+            cerebro = completo
+
+        if self.cerebro == "denso":
+            self.brain = cerebro
+        else:
+            self.brain = cerebro.para_dicionario()
+
+    def realizar_jogada(self, config, verbose=False, return_prob=False):
+        """Recebe uma configuração e retorna a configuração com jogada realizada.
+
+        Args:
+          config:
+            Configuração atual do tabuleiro. Pode ser string, instancia de
+            Configuracao, de ConfiguracaoBits ou de EstadoJogo. Jogadores
+            com `regras` recebem um `EstadoTabuleiro` (ou uma string, que é
+            convertida).
+          verbose:
+            Se `True`, então printa informações da jogada. Para ser usado no
+            debug.
+          return_prob:
+            Se `True`, então além da jogada realizada, retorna um array com as
+            probabilidades que cada casa tinha de ser sorteada. Probabilidades
+            representadas em um número entre zero e um.
+
+        Return:
+          Se `return_prob=False` então retorna uma instância de Configuração
+          (ou de ConfiguracaoBits, se foi isso que recebeu) com a jogada já
+          realizada. Um EstadoJogo (ou EstadoTabuleiro) é atualizado no lugar
+          e devolvido. Se `return_prob=True`, então retorna adicionalmente um
+          array com as probabilidade de cada casa ser jogada (probabilidades
+          antes da jogada ser realizada).
+        """
+
+        if isinstance(config, EstadoJogo):
+            casa, prob_cada_casa = self.escolhe_casa(
+                config.codigo, verbose, return_prob
+            )
+            config_up = config.jogar(casa, self.player_num)
+
+        elif isinstance(config, ConfiguracaoBits):
+            casa, prob_cada_casa = self.escolhe_casa(
+                config.codigo(), verbose, return_prob
+            )
+            config_up = config.jogar(casa, self.player_num)
+
+        elif self.regras is not None:
+            if not isinstance(config, EstadoTabuleiro):
+                config = EstadoTabuleiro(self.regras, config)
+            casa, prob_cada_casa = self.escolhe_casa_regras(
+                config, verbose, return_prob
+            )
+            config_up = config.jogar(casa, self.player_num)
+
+        else:
+            config = (
+                Configuracao(config) if isinstance(config, str) else config
+            )
+            codigo = config.codigo()
+            config.id_ = TABELA.id_canonico(codigo)
+            config.op_name = SYMMETRY_OP_NAMES[TABELA.op[codigo]]
+
+            casa, prob_cada_casa = self.escolhe_casa(
+                codigo, verbose, return_prob
+            )
+            array = config.config.ravel().copy()
+            array[casa] = self.player_num
+            config_up = Configuracao(array)
+
+        if return_prob:
+            return config_up, prob_cada_casa
+        else:
+            return config_up
+
+    def escolhe_casa(self, codigo, verbose=False, return_prob=False):
+        """Sorteia a casa a ser jogada no tabuleiro de código `codigo`.
+
+        Args:
+          codigo:
+            Código na base 3 do tabuleiro atual (veja `Configuracao.codigo`).
+          verbose:
+            Se `True`, então printa informações da jogada.
+          return_prob:
+            Se `True`, então também computa as probabilidades de cada casa.
+
+        Return:
+          Tupla com o índice (0 a 8, no tabuleiro recebido) da casa escolhida e
+          o array 3x3 de probabilidades (ou `None` se `return_prob=False`).
+        """
+
+        canonico = TABELA.canonico[codigo]
+        id_ = TABELA.ids[canonico]
+
+        if id_.count("0") == 1:
+            # apenas uma jogada a ser feita, não temos escolha
+            casa = id_.index("0")
+            casa = int(TABELA.perm[codigo][casa])
+
+            if return_prob:
+                prob_cada_casa = np.zeros(9)
+                prob_cada_casa[casa] = 1
+                return casa, prob_cada_casa.reshape(3, 3)
+            else:
+                return casa, None
+
+        if isinstance(self.brain, CerebroDenso):
+            linha = self.brain.indice[id_]
+            casa_escolhida = self.brain.sorteia(linha)
+            jogada = (linha, casa_escolhida - 1)
+            if verbose or return_prob:
+                dicionario = self.brain[id_]
+        else:
+            dicionario = self.brain[id_]
+
+            # escolhe jogada
+            casa_escolhida = self.amostrador(id_, dicionario).sorteia()
+            jogada = [dicionario, casa_escolhida, id_]
+
+        if verbose:
+            mapa = TABELA.mapa[canonico]
+            perm_inv = TABELA.perm_inv[codigo]
+            print(TABELA.tabuleiros[codigo].reshape(3, 3))
+            print(mapa[perm_inv].reshape(3, 3))
+            print(casa_escolhida)
+            print(dicionario)
+            print(SYMMETRY_OP_NAMES[TABELA.op[codigo]])
+            print()
+
+        # sorteia entre as casas equivalentes do tabuleiro canônico
+        index = choice(TABELA.equivalentes(canonico)[casa_escolhida])
+        casa = int(TABELA.perm[codigo][index])
+
+        # registra jogo feito
+        self.jogadas.append(jogada)
+
+        if return_prob:
+            # computa as chances de cada casa ser jogada
+            mapa = TABELA.mapa[canonico]
+            perm_inv = TABELA.perm_inv[codigo]
+            prob_cada_casa = np.zeros(9)
+
+            for i in range(9):
+                pos = mapa[i]
+                prob_cada_casa[i] = dicionario[pos] if pos > 0 else 0
+
+            prob_cada_casa /= prob_cada_casa.sum()
+            prob_cada_casa = prob_cada_casa[perm_inv].reshape(3, 3)
+
+            return casa, prob_cada_casa
+        else:
+            return casa, None
+
+    def escolhe_casa_regras(self, estado, verbose=False, return_prob=False):
+        """Versão do `escolhe_casa` para jogadores com `regras`.
+
+        Args:
+          estado:
+            Instância de `EstadoTabuleiro`.
+          verbose, return_prob:
+            Mesmos argumentos do `escolhe_casa`.
+
+        Return:
+          Tupla com o índice da casa escolhida e o array n x n de
+          probabilidades (ou `None` se `return_prob=False`).
+        """
+
+        regras = self.regras
+        codigo, ops, canonico = estado.canoniza()
+
+        if estado.vazias == 1:
+            # apenas uma jogada a ser feita, não temos escolha
+            casa = estado.celulas.index("0")
+            prob_cada_casa = None
+            if return_prob:
+                prob_cada_casa = np.zeros(regras.num_casas)
+                prob_cada_casa[casa] = 1
+                prob_cada_casa = prob_cada_casa.reshape(regras.n, regras.n)
+            return casa, prob_cada_casa
+
+        linha = self.brain.linha(codigo, canonico)
+        casa_escolhida = self.brain.sorteia(linha)
+        self.jogadas.append((linha, casa_escolhida - 1))
+
+        # sorteia entre as casas equivalentes do tabuleiro original
+        casa = choice(
+            sorted({regras.perms[op][casa_escolhida - 1] for op in ops})
+        )
+
+        if verbose:
+            print(estado)
+            print(casa_escolhida, dict(self.brain[codigo]))
+            print([SYMMETRY_OP_NAMES[op] for op in ops])
+            print()
+
+        if not return_prob:
+            return casa, None
+
+        # cada casa tem as missangas da jogada que ela representa
+        _, ops_canonico, _ = regras.canoniza(canonico)
+        contagens = self.brain.contagens[linha]
+        prob_cada_casa = np.zeros(regras.num_casas)
+        for j, valor in enumerate(canonico):
+            if valor == "0":
+                jogada = min(regras.perms[op][j] for op in ops_canonico)
+                prob_cada_casa[regras.perms[ops[0]][j]] = contagens[jogada]
+        prob_cada_casa /= prob_cada_casa.sum()
+        return casa, prob_cada_casa.reshape(regras.n, regras.n)
+
+    def reforcar(self, resultado):
+        """Reforça as jogadas do último jogo de acordo com o resultado.
+
+        Se o jogador foi criado com `adiar > 1`, o jogo só é guardado e os
+        reforços são aplicados de uma vez a cada `adiar` jogos (veja
+        `aplicar_pendentes`).
+
+        Args:
+          resultado:
+            "vitoria", "derrota" ou "empate", do ponto de vista deste jogador.
+        """
+
+        self.pendentes.append((self.jogadas, resultado))
+        self.jogadas = []
+        self.num_jogos += 1
+
+        if len(self.pendentes) >= self.adiar:
+            self.aplicar_pendentes()
+
+    def aplicar_pendentes(self):
+        """Aplica agora os reforços dos jogos guardados por `reforcar`."""
+        if self.pendentes:
+            trajetorias, resultados = zip(*self.pendentes)
+            self.pendentes = []
+            self.reforcar_lote(trajetorias, resultados, contar=False)
+
+    def reforcar_lote(self, trajetorias, resultados, contar=True):
+        """Reforça vários jogos terminados de uma vez.
+
+        Com `CerebroDenso`, todas as jogadas de todos os jogos são somadas em
+        uma única operação vetorizada (e as caixas só são limitadas a zero e
+        reiniciadas depois da soma). Com cérebro em dicionário os jogos são
+        aplicados um a um, exatamente como jogo a jogo.
+
+        Args:
+          trajetorias:
+            Lista com as jogadas (o `self.jogadas` ao final) de cada jogo.
+          resultados:
+            Lista com o resultado de cada jogo (veja `reforcar`).
+          contar:
+            Se `True`, soma o número de jogos em `num_jogos`.
+        """
+
+        if contar:
+            self.num_jogos += len(trajetorias)
+
+        if isinstance(self.brain, CerebroDenso):
+            jogadas = [j for jogadas in trajetorias for j in jogadas]
+            if not jogadas:
+                return
+            linhas, colunas = zip(*jogadas)
+            reforcos = [self.valor_reforco(r) for r in resultados]
+            if len(set(reforcos)) == 1:
+                reforcos = reforcos[0]
+            else:
+                reforcos = np.repeat(reforcos, [len(j) for j in trajetorias])
+            self.brain.reforca(linhas, colunas, reforcos, self.valor_inicial)
+            return
+
+        for jogadas, resultado in zip(trajetorias, resultados):
+            reforco = self.valor_reforco(resultado)
+
+            for dicionario, casa_escolhida, id_ in jogadas:
+                dicionario[casa_escolhida] += reforco
+
+                if dicionario[casa_escolhida] < 0:
+                    dicionario[casa_escolhida] = 0
+
+                # se uma caixa está sem missangas, temos que resetá-la
+                if sum(dicionario.values()) <= 0:
+                    for k in dicionario:
+                        dicionario[k] = self.valor_inicial
+                    if _PERFIL is not None:
+                        _PERFIL.reinicios += 1
+
+                entrada = self.amostradores.get(id_)
+                if entrada is not None and entrada[0] is dicionario:
+                    entrada[1].reconstroi(dicionario.values())
+
+    def valor_reforco(self, resultado):
+        """Número de missangas somadas para um resultado."""
+        assert resultado in ["vitoria", "derrota", "empate"]
+        return getattr(self, f"reforco_{resultado}")
+
+    def atualizar_vitoria(self):
+        """Atualiza os dicionários de escolha em caso de vitória."""
+        self.reforcar("vitoria")
+
+    def atualizar_derrota(self):
+        """Atualiza os dicionários de escolha em caso de derrota."""
+        self.reforcar("derrota")
+
+    def atualizar_empate(self):
+        """Atualiza os dicionários de escolha em caso de empate."""
+        self.reforcar("empate")
+
+
+def resolve_minimax():
+    """Resolve o jogo da velha por minimax, sobre os tabuleiros canônicos.
+
+    Todo tabuleiro canônico ainda não terminado é resolvido para os dois
+    jogadores da vez (então serve também para jogos onde o jogador 2
+    começa). O valor é do ponto de vista de quem joga: 0 é velha, positivo é
+    vitória e negativo derrota, com módulo maior quanto mais cedo o jogo
+    acaba, de modo que o jogador perfeito ganha o mais rápido possível e
+    perde o mais tarde possível.
+
+    Returns:
+      Tupla com dois arrays (2, 3^9) indexados por [vez - 1, código
+      canônico]: o valor (int8) e a máscara de 9 bits (bit i = casa i do
+      tabuleiro canônico) das jogadas ótimas.
+    """
+
+    pesos = 1 << np.arange(9)
+    ganhou = [
+        np.array(VITORIA_MASCARA)[((TABELA.tabuleiros == p) * pesos).sum(1)]
+        for p in [1, 2]
+    ]
+    valores = np.zeros((2, NUM_TABULEIROS), dtype=np.int8)
+    otimas = np.zeros((2, NUM_TABULEIROS), dtype=np.int16)
+    resolvido = np.zeros((2, NUM_TABULEIROS), dtype=bool)
+    potencias = POTENCIAS_3.tolist()
+
+    def negamax(codigo, vez):
+        if resolvido[vez - 1, codigo]:
+            return int(valores[vez - 1, codigo])
+
+        vazias = TABELA.ids[codigo].count("0")
+        melhor, mascara = None, 0
+        for casa in CASAS_MASCARA[
+            sum(1 << i for i, c in enumerate(TABELA.ids[codigo]) if c == "0")
+        ]:
+            filho = codigo + vez * potencias[casa]
+            if ganhou[vez - 1][filho]:
+                valor = vazias
+            elif vazias == 1:
+                valor = 0
+            else:
+                valor = -negamax(int(TABELA.canonico[filho]), 3 - vez)
+
+            if melhor is None or valor > melhor:
+                melhor, mascara = valor, 1 << casa
+            elif valor == melhor:
+                mascara |= 1 << casa
+
+        valores[vez - 1, codigo] = melhor
+        otimas[vez - 1, codigo] = mascara
+        resolvido[vez - 1, codigo] = True
+        return melhor
+
+    for codigo in np.unique(TABELA.canonico).tolist():
+        if ganhou[0][codigo] or ganhou[1][codigo]:
+            continue
+        if "0" in TABELA.ids[codigo]:
+            negamax(codigo, 1)
+            negamax(codigo, 2)
+
+    return valores, otimas
+
+
+def caminho_minimax():
+    """Arquivo de cache da tabela de transposição do `resolve_minimax`."""
+    fonte = assinatura_regras() + inspect.getsource(resolve_minimax)
+    assinatura = hashlib.sha1(fonte.encode()).hexdigest()[:16]
+    return os.path.join(PASTA_CACHE, f"minimax_{assinatura}.npz")
+
+
+@lru_cache(maxsize=None)
+def carrega_minimax(usar_cache=True):
+    """Tabela de transposição do minimax, indexada pelo código do tabuleiro.
+
+    Na primeira vez o jogo é resolvido com `resolve_minimax` e o resultado é
+    salvo em `PASTA_CACHE`; depois disso ele é só lido do disco. As tabelas
+    dos tabuleiros canônicos são então expandidas para todos os 3^9 códigos,
+    com as jogadas ótimas já levadas para as casas do tabuleiro original,
+    então consultar uma jogada é só indexar uma lista.
+
+    Args:
+      usar_cache:
+        Se `False`, sempre resolve o jogo (e não mexe no cache).
+
+    Returns:
+      Tupla com duas listas indexadas por [vez - 1][código]: o valor (veja
+      `resolve_minimax`) e a máscara de 9 bits das casas ótimas.
+    """
+
+    caminho = caminho_minimax()
+    resolvido = None
+    if usar_cache and os.path.exists(caminho):
+        try:
+            with np.load(caminho) as arquivo:
+                resolvido = arquivo["valores"], arquivo["otimas"]
+        except (OSError, ValueError, KeyError):
+            # cache corrompido, resolve de novo
+            pass
+
+    if resolvido is None:
+        resolvido = resolve_minimax()
+        if usar_cache:
+            try:
+                os.makedirs(PASTA_CACHE, exist_ok=True)
+                temporario = f"{caminho}.{os.getpid()}.tmp"
+                with open(temporario, "wb") as handle:
+                    np.savez(handle, valores=resolvido[0], otimas=resolvido[1])
+                os.replace(temporario, caminho)
+            except OSError:
+                pass
+
+    valores, otimas = resolvido
+    otimas = otimas[:, TABELA.canonico].astype(np.int64)
+    bits = (otimas[:, :, None] >> np.arange(9)) & 1
+    mascaras = (bits << TABELA.perm.astype(np.int64)).sum(axis=2)
+    return valores[:, TABELA.canonico].tolist(), mascaras.tolist()
+
+
+class JogadorPerfeito(Jogador):
+    """Adversário que joga perfeitamente, pela tabela do minimax.
+
+    Pode ser usado na `simulacao` (e em qualquer lugar que espere um
+    `Jogador`) no lugar de um jogador que aprende: os reforços não fazem
+    nada. Cada jogada é só uma consulta na tabela de `carrega_minimax`.
+
+    Para a `simulacao_em_lote`, que sorteia direto das matrizes de um
+    `CerebroDenso`, ele tem também um cérebro congelado com uma missanga em
+    cada jogada ótima (só na de menor índice se `aleatorio=False`) e reforços
+    iguais a zero, então as missangas nunca mudam.
+
+    Args:
+      player_num:
+        Peça do jogador (1 ou 2), como no `Jogador`.
+      aleatorio:
+        Se `True`, sorteia entre as jogadas ótimas; se `False`, joga sempre a
+        de menor índice.
+      usar_cache:
+        Se `True`, lê a tabela do minimax do cache em disco.
+    """
+
+    def __init__(self, player_num=1, aleatorio=True, usar_cache=True):
+        self.player_num = player_num
+        self.aleatorio = aleatorio
+        self.usar_cache = usar_cache
+        self.regras = None
+        self.cerebro = "denso"
+        self.valor_inicial = 1
+        self.decay_do_valor_inicial = 1
+        self.reforco_vitoria = 0
+        self.reforco_derrota = 0
+        self.reforco_empate = 0
+        self.adiar = 1
+        self.jogadas = []
+        self.pendentes = []
+        self.num_jogos = 0
+        self.amostradores = {}
+        valores, mascaras = carrega_minimax(usar_cache)
+        self.valores = valores[player_num - 1]
+        self.mascaras = mascaras[player_num - 1]
+        self.cria_dicionario_jogadas()
+
+    def cria_dicionario_jogadas(self):
+        """Cria o cérebro congelado com as jogadas ótimas (veja a classe)."""
+        cerebro = carrega_estados(self.player_num, 8, 2, self.usar_cache)
+
+        # o canônico é o seu próprio tabuleiro original, então a máscara das
+        # casas ótimas do código canônico já está no tabuleiro canônico
+        codigos = [int(id_, 3) for id_ in cerebro.ids]
+        otimas = np.array(self.mascaras)[codigos] & (
+            cerebro.validas @ (1 << np.arange(9))
+        )
+        if not self.aleatorio:
+            otimas &= -otimas
+        cerebro.contagens[:] = (otimas[:, None] >> np.arange(9)) & 1
+        cerebro.sincroniza()
+        self.brain = cerebro
+
+    def valor(self, codigo):
+        """Valor minimax do tabuleiro `codigo` com este jogador na vez."""
+        return self.valores[codigo]
+
+    def escolhe_casa(self, codigo, verbose=False, return_prob=False):
+        """Escolhe uma casa ótima (mesmo retorno de `Jogador.escolhe_casa`)."""
+        casas = CASAS_MASCARA[self.mascaras[codigo]]
+        assert casas, "Não há jogadas neste tabuleiro"
+        casa = choice(casas) if self.aleatorio else casas[0]
+
+        if verbose:
+            print(TABELA.tabuleiros[codigo].reshape(3, 3))
+            print(casas, self.valores[codigo])
+            print()
+
+        if not return_prob:
+            return casa, None
+
+        prob_cada_casa = np.zeros(9)
+        if self.aleatorio:
+            prob_cada_casa[casas] = 1 / len(casas)
+        else:
+            prob_cada_casa[casa] = 1
+        return casa, prob_cada_casa.reshape(3, 3)
+
+    def reforcar(self, resultado):
+        """Não aprende nada; só conta o jogo."""
+        self.num_jogos += 1
+
+    def reforcar_lote(self, trajetorias, resultados, contar=True):
+        """Não aprende nada; só conta os jogos."""
+        if contar:
+            self.num_jogos += len(trajetorias)
+
+
+# Significados possíveis dos códigos 1 e 2 de um `Historico`: a peça que
+# ganhou (como em `EstadoJogo.resultado`) ou quem ganhou do ponto de vista de
+# um jogador (1: o adversário, 2: o próprio jogador; é o placar da interface,
+# jogador x MENACE).
+CODIGOS_PECAS = "pecas"
+CODIGOS_ADVERSARIO = "adversario"
+
+
+class Historico:
+    """Histórico compacto dos resultados de uma sequência de jogos.
+
+    Guarda um único int8 por jogo (`EMPATE`, 1 ou 2 para quem ganhou) em um
+    array que cresce conforme necessário. O que 1 e 2 querem dizer fica em
+    `codigos`: por padrão são as peças, como em `EstadoJogo.resultado`. As
+    curvas acumuladas de vitórias e empates são calculadas só quando pedidas.
+    Para manter compatibilidade com a antiga lista de listas, `historico[0]`,
+    `historico[1]` e `historico[2]` são as curvas de vitórias do 1, do 2 e de
+    empates.
+
+    Args:
+      arquivo:
+        Caminho opcional de um arquivo onde cada resultado é anexado (um byte
+        por jogo) assim que é registrado. Pode ser lido com `Historico.carrega`.
+      capacidade:
+        Tamanho inicial do array.
+      codigos:
+        `CODIGOS_PECAS` (1 e 2 são a peça que ganhou) ou `CODIGOS_ADVERSARIO`
+        (1 é o adversário, 2 é o dono do histórico; veja `converte`).
+    """
+
+    def __init__(self, arquivo=None, capacidade=1024, codigos=CODIGOS_PECAS):
+        if codigos not in (CODIGOS_PECAS, CODIGOS_ADVERSARIO):
+            raise ValueError(f"códigos de histórico desconhecidos: {codigos}")
+        self._resultados = np.zeros(max(capacidade, 1), dtype=np.int8)
+        self.num_jogos = 0
+        self.codigos = codigos
+        self.arquivo = arquivo
+        self._handle = open(arquivo, "ab") if arquivo else None
+
+    @classmethod
+    def de_resultados(cls, resultados, arquivo=None, codigos=CODIGOS_PECAS):
+        """Cria um histórico a partir de um array de resultados."""
+        historico = cls(arquivo, len(resultados), codigos)
+        historico.registra_varios(resultados)
+        return historico
+
+    @classmethod
+    def de_curvas(cls, vitorias1, vitorias2, empates, codigos=CODIGOS_PECAS):
+        """Cria um histórico a partir das curvas acumuladas (lista de listas)."""
+        resultados = np.zeros(len(vitorias1) - 1, dtype=np.int8)
+        resultados[np.diff(vitorias1) > 0] = 1
+        resultados[np.diff(vitorias2) > 0] = 2
+        return cls.de_resultados(resultados, codigos=codigos)
+
+    @classmethod
+    def carrega(cls, arquivo, codigos=CODIGOS_PECAS):
+        """Lê um arquivo gravado por um histórico com `arquivo`."""
+        return cls.de_resultados(
+            np.fromfile(arquivo, dtype=np.int8), codigos=codigos
+        )
+
+    @property
+    def resultados(self):
+        """Array (visão, sem cópia) com o resultado de cada jogo."""
+        return self._resultados[: self.num_jogos]
+
+    def registra(self, resultado):
+        """Registra o resultado de um jogo."""
+        if self.num_jogos == len(self._resultados):
+            self._cresce(self.num_jogos + 1)
+        self._resultados[self.num_jogos] = resultado
+        self.num_jogos += 1
+        if self._handle:
+            self._handle.write(bytes((resultado,)))
+
+    def registra_varios(self, resultados):
+        """Registra o resultado de vários jogos, em ordem."""
+        resultados = np.asarray(resultados, dtype=np.int8)
+        fim = self.num_jogos + len(resultados)
+        if fim > len(self._resultados):
+            self._cresce(fim)
+        self._resultados[self.num_jogos : fim] = resultados
+        self.num_jogos = fim
+        if self._handle:
+            self._handle.write(resultados.tobytes())
+
+    def _cresce(self, minimo):
+        novo = np.zeros(max(minimo, 2 * len(self._resultados)), np.int8)
+        novo[: self.num_jogos] = self.resultados
+        self._resultados = novo
+
+    def substitui(self, outro):
+        """Troca todo o conteúdo deste histórico pelo de `outro`.
+
+        Os dois devem ter os mesmos `codigos` (veja `converte`).
+        """
+        if outro.codigos != self.codigos:
+            raise ValueError(
+                f"histórico com códigos {outro.codigos}, esperava "
+                f"{self.codigos}"
+            )
+        self._resultados = outro.resultados.copy()
+        self.num_jogos = outro.num_jogos
+
+    def converte(self, codigos, player_num):
+        """Cópia do histórico com outro significado para 1 e 2.
+
+        Args:
+          codigos:
+            `CODIGOS_PECAS` ou `CODIGOS_ADVERSARIO`.
+          player_num:
+            Peça (1 ou 2) do dono do histórico.
+
+        Returns:
+          Novo `Historico`, sem arquivo.
+        """
+        resultados = self.resultados
+        # a conversão é a mesma nos dois sentidos: com a peça 2, os códigos
+        # coincidem; com a peça 1, 1 e 2 trocam de lugar
+        if codigos != self.codigos and player_num == 1:
+            resultados = np.where(resultados == EMPATE, EMPATE, 3 - resultados)
+        return Historico.de_resultados(resultados, codigos=codigos)
+
+    def totais(self):
+        """Número de vitórias 1, vitórias 2 e empates."""
+        contagem = np.bincount(self.resultados, minlength=3)
+        return int(contagem[1]), int(contagem[2]), int(contagem[EMPATE])
+
+    def curvas(self):
+        """Curvas acumuladas (vitórias 1, vitórias 2, empates), começando em 0.
+
+        São arrays com `num_jogos + 1` valores, como as listas que a
+        `simulacao` retornava.
+        """
+        return tuple(self[i] for i in range(3))
+
+    def __getitem__(self, i):
+        codigo = [1, 2, EMPATE][i]
+        curva = np.zeros(self.num_jogos + 1, dtype=np.int64)
+        np.cumsum(self.resultados == codigo, out=curva[1:])
+        return curva
+
+    def __iter__(self):
+        return iter(self.curvas())
+
+    def __len__(self):
+        return 3
+
+    def fechar(self):
+        """Fecha o arquivo (se houver) garantindo que tudo foi gravado."""
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        estado["_resultados"] = self.resultados.copy()
+        estado["_handle"] = None
+        return estado
+
+
+# Formato de arquivo dos cérebros (.npz sem pickle). Aumente a versão sempre
+# que mudar os campos salvos.
+FORMATO_CEREBRO = 1
+
+
+def salva_cerebro(caminho, jogador, historico=None):
+    """Salva o cérebro de um jogador (e opcionalmente um histórico).
+
+    O arquivo é um .npz sem compressão e sem pickle com os campos:
+    `formato` (versão), `codigos` (código na base 3 do ID de cada caixa),
+    `contagens` (matriz de missangas), `validas` (jogadas de cada caixa),
+    `metadados` (JSON com player_num, os parâmetros de reforço, os
+    `historico_codigos` e, se houver, as `regras` como [n, k]) e
+    `historico` (resultados, veja `Historico`). A escrita é atômica: o arquivo
+    antigo só é substituído quando o novo está completo.
+
+    Args:
+      caminho:
+        Arquivo de saída (de preferência com extensão .npz).
+      jogador:
+        Instância de `Jogador`.
+      historico:
+        Instância opcional de `Historico`.
+    """
+
+    cerebro = jogador.brain
+    if isinstance(cerebro, CerebroEsparso):
+        n = len(cerebro)
+        codigos = cerebro.codigos[:n]
+        contagens, validas = cerebro.contagens[:n], cerebro.validas[:n]
+    else:
+        if not isinstance(cerebro, CerebroDenso):
+            cerebro = CerebroDenso.de_dicionario(cerebro)
+        codigos = np.array([int(id_, 3) for id_ in cerebro.ids], np.int32)
+        contagens, validas = cerebro.contagens, cerebro.validas
+
+    metadados = {
+        "player_num": jogador.player_num,
+        "valor_inicial": jogador.valor_inicial,
+        "reforco_vitoria": jogador.reforco_vitoria,
+        "reforco_derrota": jogador.reforco_derrota,
+        "reforco_empate": jogador.reforco_empate,
+        "decay_do_valor_inicial": jogador.decay_do_valor_inicial,
+        "num_jogos": jogador.num_jogos,
+        "historico_codigos": CODIGOS_PECAS,
+    }
+    if jogador.regras is not None:
+        metadados["regras"] = [jogador.regras.n, jogador.regras.k]
+    resultados = np.zeros(0)
+    if historico is not None:
+        resultados = historico.resultados
+        metadados["historico_codigos"] = historico.codigos
+
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    os.makedirs(pasta, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as handle:
+        np.savez(
+            handle,
+            formato=np.array(FORMATO_CEREBRO),
+            codigos=codigos,
+            contagens=contagens.astype(np.int32),
+            validas=validas,
+            metadados=np.array(json.dumps(metadados)),
+            historico=np.asarray(resultados, dtype=np.int8),
+        )
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporario, caminho)
+
+
+def carrega_cerebro(caminho, jogador=None, cerebro=None):
+    """Lê um arquivo salvo por `salva_cerebro`.
+
+    Só os campos pedidos são lidos do disco (o .npz é lido sob demanda).
+
+    Args:
+      caminho:
+        Arquivo salvo por `salva_cerebro`.
+      jogador:
+        Instância de `Jogador` que recebe o cérebro (mantendo o tipo de
+        cérebro dela). Se for `None`, um novo `Jogador` é criado com os
+        parâmetros salvos.
+      cerebro:
+        Tipo de cérebro do jogador novo (veja `Jogador`). Por padrão,
+        "dicionario".
+
+    Returns:
+      Tupla com o jogador e um `Historico` com os resultados salvos (com os
+      `codigos` com que foram salvos; arquivos sem `historico_codigos` nos
+      metadados usam `CODIGOS_PECAS`).
+    """
+
+    with np.load(caminho, allow_pickle=False) as arquivo:
+        formato = int(arquivo["formato"])
+        if formato > FORMATO_CEREBRO:
+            raise ValueError(
+                f"{caminho} usa o formato {formato}, mais novo que o "
+                f"suportado ({FORMATO_CEREBRO})"
+            )
+        metadados = json.loads(str(arquivo["metadados"]))
+        if "regras" in metadados:
+            metadados["regras"] = Regras(*metadados["regras"])
+            salvo = CerebroEsparso(
+                metadados["regras"],
+                metadados["valor_inicial"],
+                metadados["decay_do_valor_inicial"],
+                arquivo["codigos"],
+                arquivo["contagens"],
+                arquivo["validas"],
+            )
+        else:
+            ids = [TABELA.ids[codigo] for codigo in arquivo["codigos"]]
+            salvo = CerebroDenso(ids, arquivo["contagens"], arquivo["validas"])
+        historico = Historico.de_resultados(
+            arquivo["historico"],
+            codigos=metadados.pop("historico_codigos", CODIGOS_PECAS),
+        )
+
+    num_jogos = metadados.pop("num_jogos", 0)
+    if jogador is None:
+        jogador = Jogador(cerebro=cerebro or "dicionario", **metadados)
+
+    jogador.de_denso(salvo)
+    jogador.jogadas = []
+    jogador.pendentes = []
+    jogador.num_jogos = num_jogos
+
+    return jogador, historico
+
+
+def testa_perfeito_em_lote():
+    """O `JogadorPerfeito` na `simulacao_em_lote`, nas duas peças, não pode
+    perder nem aprender. Se der print, tem algo errado."""
+    for aleatorio in [True, False]:
+        for player_num in [1, 2]:
+            perfeito = JogadorPerfeito(player_num, aleatorio)
+            contagens = perfeito.brain.contagens.copy()
+            outro = Jogador(3 - player_num, cerebro="denso")
+            jogadores = [perfeito, outro][:: 1 if player_num == 1 else -1]
+            _, _, vitorias1, vitorias2, _ = simulacao_em_lote(
+                *jogadores, 2000, 100, semente=0
+            )
+            derrotas = [vitorias2, vitorias1][player_num - 1][-1]
+            if derrotas or not np.array_equal(
+                contagens, perfeito.brain.contagens
+            ):
+                print(player_num, aleatorio, derrotas)
+
+
+def testa_carrega_sob_demanda():
+    """Salva um cérebro "sob_demanda" (só com as caixas usadas) e carrega em
+    todos os tipos de cérebro. Se der print, tem algo errado."""
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "brain.npz")
+        jogador = Jogador(1, cerebro="sob_demanda")
+        simulacao(jogador, Jogador(2), 5)
+        salva_cerebro(caminho, jogador)
+
+        carregados = [
+            carrega_cerebro(caminho)[0],
+            carrega_cerebro(caminho, cerebro="denso")[0],
+            carrega_cerebro(caminho, cerebro="sob_demanda")[0],
+            carrega_cerebro(caminho, Jogador(1))[0],
+            carrega_cerebro(caminho, Jogador(1, cerebro="denso"))[0],
+        ]
+        for carregado in carregados:
+            try:
+                for id_, caixa in jogador.brain.items():
+                    assert dict(carregado.brain[id_]) == caixa
+                simulacao(carregado, Jogador(2), 50)
+                simulacao_em_lote(carregado, Jogador(2), 50, 10, semente=0)
+            except (AssertionError, KeyError, IndexError) as erro:
+                print(carregado.cerebro, repr(erro))
+
+
+def testa_historico_codigos():
+    """Salva históricos com os dois significados de 1 e 2 e confere que o
+    significado volta com o arquivo. Se der print, tem algo errado."""
+    jogador = Jogador(1)
+    pecas = Historico.de_resultados([1, 2, EMPATE, 1])
+    adversario = pecas.converte(CODIGOS_ADVERSARIO, jogador.player_num)
+    if adversario.totais() != (1, 2, 1):
+        print("converte", adversario.totais())
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "brain.npz")
+        for historico in [pecas, adversario]:
+            salva_cerebro(caminho, jogador, historico)
+            _, carregado = carrega_cerebro(caminho)
+            volta = carregado.converte(CODIGOS_PECAS, jogador.player_num)
+            if carregado.codigos != historico.codigos or not np.array_equal(
+                volta.resultados, pecas.resultados
+            ):
+                print(historico.codigos, carregado.codigos, volta.resultados)
+
+
+# Registro binário de partidas: um cabeçalho seguido de registros de tamanho
+# fixo, para que o arquivo possa ser lido com `np.memmap`.
+MAGICO_PARTIDAS = b"MENACEPT"
+VERSAO_PARTIDAS = 1
+TAMANHO_CABECALHO_PARTIDAS = 16
+DTYPE_PARTIDA = np.dtype(
+    [
+        ("casas", np.int8, (9,)),  # casas jogadas em ordem, -1 no fim
+        ("quem_comecou", np.int8),  # peça (1 ou 2) da primeira jogada
+        ("resultado", np.int8),  # EMPATE, ou 1 ou 2 para quem ganhou
+    ]
+)
+
+
+class RegistroPartidas:
+    """Grava cada partida jogada em um arquivo binário, só anexando.
+
+    Cada partida é um registro de tamanho fixo (`DTYPE_PARTIDA`) com a
+    sequência de casas, quem começou e o resultado. O arquivo pode ser lido
+    sem carregar tudo na memória com `le_partidas` e usado para treinar um
+    cérebro de novo com outros reforços (`treina_por_replay`).
+
+    Args:
+      caminho:
+        Arquivo do registro. Se já existir, as partidas novas são anexadas.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        novo = not os.path.exists(caminho) or os.path.getsize(caminho) == 0
+        if not novo:
+            _confere_cabecalho_partidas(caminho)
+        self._handle = open(caminho, "ab")
+        if novo:
+            cabecalho = (
+                MAGICO_PARTIDAS
+                + np.array(
+                    [VERSAO_PARTIDAS, DTYPE_PARTIDA.itemsize], dtype="<u4"
+                ).tobytes()
+            )
+            self._handle.write(cabecalho)
+
+    def registra(self, casas, resultado, quem_comecou=1):
+        """Grava uma partida.
+
+        Args:
+          casas:
+            Sequência com as casas (0 a 8) jogadas, em ordem.
+          resultado:
+            `EMPATE`, ou 1 ou 2 para quem ganhou.
+          quem_comecou:
+            Peça (1 ou 2) de quem fez a primeira jogada.
+        """
+        partida = np.zeros(1, dtype=DTYPE_PARTIDA)
+        partida["casas"] = -1
+        partida["casas"][0, : len(casas)] = casas
+        partida["quem_comecou"] = quem_comecou
+        partida["resultado"] = resultado
+        self._handle.write(partida.tobytes())
+
+    def registra_varios(self, casas, resultados, quem_comecou=1):
+        """Grava várias partidas; `casas` é um array (partidas, 9)."""
+        partidas = np.zeros(len(resultados), dtype=DTYPE_PARTIDA)
+        partidas["casas"] = casas
+        partidas["quem_comecou"] = quem_comecou
+        partidas["resultado"] = resultados
+        self._handle.write(partidas.tobytes())
+
+    def flush(self, sincronizar=False):
+        """Garante que tudo que foi registrado está no arquivo.
+
+        Com `sincronizar=True` também espera o sistema operacional gravar o
+        arquivo no disco (`os.fsync`).
+        """
+        self._handle.flush()
+        if sincronizar:
+            os.fsync(self._handle.fileno())
+
+    def fechar(self):
+        """Fecha o arquivo."""
+        self._handle.close()
+
+
+def _confere_cabecalho_partidas(caminho):
+    with open(caminho, "rb") as handle:
+        cabecalho = handle.read(TAMANHO_CABECALHO_PARTIDAS)
+    versao, tamanho = np.frombuffer(cabecalho[8:], dtype="<u4")
+    if (
+        cabecalho[:8] != MAGICO_PARTIDAS
+        or versao != VERSAO_PARTIDAS
+        or tamanho != DTYPE_PARTIDA.itemsize
+    ):
+        raise ValueError(f"{caminho} não é um registro de partidas válido")
+
+
+def le_partidas(caminho):
+    """Abre um registro de partidas como array mapeado em memória.
+
+    Returns:
+      Array estruturado (`DTYPE_PARTIDA`) só de leitura, com uma partida por
+      elemento. Os dados só são lidos do disco quando acessados.
+    """
+    _confere_cabecalho_partidas(caminho)
+    tamanho = os.path.getsize(caminho) - TAMANHO_CABECALHO_PARTIDAS
+    num_partidas = tamanho // DTYPE_PARTIDA.itemsize
+    if num_partidas == 0:
+        return np.zeros(0, dtype=DTYPE_PARTIDA)
+    return np.memmap(
+        caminho,
+        dtype=DTYPE_PARTIDA,
+        mode="r",
+        offset=TAMANHO_CABECALHO_PARTIDAS,
+        shape=(num_partidas,),
+    )
+
+
+def jogadas_das_partidas(partidas, jogador):
+    """Recupera, vetorizado, as jogadas de `jogador` em cada partida.
+
+    Refaz os tabuleiros de todas as partidas de uma vez a partir das casas
+    jogadas e encontra a caixa (linha do `CerebroDenso`) e a jogada (coluna)
+    de cada jogada feita pela peça `jogador.player_num`.
+
+    Returns:
+      Tupla (jogos, linhas, colunas) de arrays, ordenada por jogo.
+    """
+    cerebro = jogador.para_denso()
+    casas = np.asarray(partidas["casas"], dtype=np.int64)
+    quem_comecou = np.asarray(partidas["quem_comecou"], dtype=np.int64)
+
+    rodadas = np.arange(9)
+    pecas = np.where(
+        rodadas % 2 == 0, quem_comecou[:, None], 3 - quem_comecou[:, None]
+    )
+    jogou = casas >= 0
+    delta = np.where(jogou, pecas * POTENCIAS_3[np.maximum(casas, 0)], 0)
+    codigos = np.cumsum(delta, axis=1) - delta  # tabuleiro antes da jogada
+
+    # só jogadas deste jogador com pelo menos duas casas livres
+    escolha = jogou & (pecas == jogador.player_num) & (rodadas <= 7)
+    jogos, rodada = np.nonzero(escolha)
+    codigo = codigos[jogos, rodada]
+    casa = casas[jogos, rodada]
+
+    canonico = TABELA.canonico[codigo]
+    linhas = cerebro.linha_por_codigo()[canonico]
+    colunas = TABELA.mapa[canonico, TABELA.perm_inv[codigo, casa]] - 1
+
+    # jogadas em configurações que o cérebro não conhece são ignoradas
+    conhecidas = linhas >= 0
+    return jogos[conhecidas], linhas[conhecidas], colunas[conhecidas]
+
+
+def treina_por_replay(partidas, jogador, tamanho_lote=1):
+    """Treina o cérebro de `jogador` com partidas já jogadas.
+
+    As jogadas não são sorteadas de novo: cada partida do registro é aplicada
+    como se `jogador` tivesse feito as jogadas da peça `player_num`, usando os
+    reforços do próprio `jogador`. Assim dá para ver o que uma sessão teria
+    ensinado com outros parâmetros, sem jogar tudo de novo.
+
+    Args:
+      partidas:
+        Caminho de um `RegistroPartidas` ou array retornado por `le_partidas`.
+      jogador:
+        Instância de `Jogador` a ser treinada (o cérebro vira `CerebroDenso`).
+      tamanho_lote:
+        Número de partidas reforçadas de uma vez. Com 1 o resultado é o mesmo
+        de reforçar jogo a jogo; lotes maiores são mais rápidos (veja
+        `Jogador.reforcar_lote`).
+
+    Returns:
+      O próprio `jogador`.
+    """
+
+    if isinstance(partidas, str):
+        partidas = le_partidas(partidas)
+
+    jogos, linhas, colunas = jogadas_das_partidas(partidas, jogador)
+    resultado = np.asarray(partidas["resultado"])
+    num = jogador.player_num
+    reforcos = np.full(len(partidas), jogador.reforco_derrota)
+    reforcos[resultado == num] = jogador.reforco_vitoria
+    reforcos[resultado == EMPATE] = jogador.reforco_empate
+
+    inicios = np.searchsorted(jogos, np.arange(0, len(partidas), tamanho_lote))
+    fins = np.append(inicios[1:], len(jogos))
+    linhas, colunas = linhas.tolist(), colunas.tolist()
+
+    for lote, (inicio, fim) in enumerate(zip(inicios, fins)):
+        if inicio == fim:
+            continue
+        if tamanho_lote == 1:
+            reforco = int(reforcos[lote])
+        else:
+            reforco = reforcos[jogos[inicio:fim]]
+        jogador.brain.reforca(
+            linhas[inicio:fim],
+            colunas[inicio:fim],
+            reforco,
+            jogador.valor_inicial,
+        )
+
+    jogador.num_jogos += len(partidas)
+    return jogador
+
+
+class DiarioCerebro:
+    """Diário (write-ahead log) e checkpoints do cérebro de um jogador.
+
+    Cada partida reforçada é anexada a um diário no formato de
+    `RegistroPartidas` e, a cada `jogos_por_checkpoint` partidas, uma cópia do
+    cérebro é salva com `salva_cerebro` em `caminho`. Tudo que toca o disco
+    roda em uma thread separada: `registra` e `checkpoint` só põem o trabalho
+    em uma fila e voltam na hora. Se o programa cair, o último checkpoint mais
+    as partidas do diário reconstroem o cérebro (veja `recupera`).
+
+    Os diários ficam ao lado do checkpoint, em arquivos
+    `{caminho}.{num_jogos}.diario`, onde `num_jogos` é o número de jogos do
+    jogador quando o diário foi aberto. Diários já cobertos por um checkpoint
+    são apagados depois que ele é gravado.
+
+    Args:
+      caminho:
+        Arquivo do checkpoint (veja `salva_cerebro`).
+      jogador:
+        Instância de `Jogador` cujo cérebro é protegido. Cada partida
+        registrada deve corresponder a um jogo reforçado (`reforcar`).
+      historico:
+        Instância opcional de `Historico`, salva junto nos checkpoints.
+      codigo_historico:
+        Função que leva um array de resultados (`EstadoJogo.resultado`) aos
+        códigos registrados no `historico` quando o diário é refeito. Por
+        padrão, as peças são convertidas para os `codigos` do `historico`
+        (veja `Historico.converte`).
+      recuperar:
+        Se `True`, carrega o checkpoint e o diário existentes no `jogador` (e
+        no `historico`). Se `False`, os diários antigos são apagados.
+      jogos_por_checkpoint:
+        Número de partidas entre dois checkpoints.
+    """
+
+    def __init__(
+        self,
+        caminho,
+        jogador,
+        historico=None,
+        codigo_historico=None,
+        recuperar=True,
+        jogos_por_checkpoint=10,
+    ):
+        self.caminho = caminho
+        self.jogador = jogador
+        self.historico = historico
+        self.codigo_historico = codigo_historico
+        self.jogos_por_checkpoint = jogos_por_checkpoint
+        self.num_recuperados = self.recupera() if recuperar else 0
+        if not recuperar:
+            for _, arquivo in self._diarios():
+                os.remove(arquivo)
+
+        self._jogos_no_diario = 0
+        self._fila = queue.Queue()
+        self._registro = RegistroPartidas(self._caminho_diario())
+        self._thread = threading.Thread(target=self._escreve, daemon=True)
+        self._thread.start()
+
+    def _caminho_diario(self, num_jogos=None):
+        if num_jogos is None:
+            num_jogos = self.jogador.num_jogos
+        return f"{self.caminho}.{num_jogos}.diario"
+
+    def _diarios(self):
+        """Lista (num_jogos, arquivo) dos diários existentes, em ordem."""
+        pasta, nome = os.path.split(os.path.abspath(self.caminho))
+        diarios = []
+        if os.path.isdir(pasta):
+            for arquivo in os.listdir(pasta):
+                meio = arquivo[len(nome) + 1 : -len(".diario")]
+                if (
+                    arquivo.startswith(f"{nome}.")
+                    and arquivo.endswith(".diario")
+                    and meio.isdigit()
+                ):
+                    diarios.append((int(meio), os.path.join(pasta, arquivo)))
+        return sorted(diarios)
+
+    def recupera(self):
+        """Carrega o último checkpoint e refaz as partidas do diário.
+
+        As partidas são refeitas com `treina_por_replay`, na ordem em que foram
+        jogadas, e os resultados delas entram no `historico` (veja
+        `codigo_historico`).
+
+        Returns:
+          Número de partidas refeitas a partir do diário.
+        """
+
+        if os.path.exists(self.caminho):
+            _, historico = carrega_cerebro(self.caminho, self.jogador)
+            if self.historico is not None:
+                self.historico.substitui(
+                    historico.converte(
+                        self.historico.codigos, self.jogador.player_num
+                    )
+                )
+
+        partidas = []
+        for inicio, arquivo in self._diarios():
+            diario = le_partidas(arquivo)
+            # partidas que já estão no checkpoint ficam de fora
+            pular = max(self.jogador.num_jogos - inicio, 0)
+            if pular < len(diario):
+                partidas.append(np.array(diario[pular:]))
+        if not partidas:
+            return 0
+        partidas = np.concatenate(partidas)
+
+        denso = copy.copy(self.jogador)
+        treina_por_replay(partidas, denso)
+        self.jogador.de_denso(denso.brain)
+        self.jogador.num_jogos = denso.num_jogos
+        if self.historico is not None:
+            resultados = partidas["resultado"]
+            if self.codigo_historico is not None:
+                resultados = self.codigo_historico(resultados)
+            else:
+                resultados = (
+                    Historico.de_resultados(resultados)
+                    .converte(self.historico.codigos, self.jogador.player_num)
+                    .resultados
+                )
+            self.historico.registra_varios(resultados)
+        return len(partidas)
+
+    def registra(self, casas, resultado, quem_comecou=1):
+        """Anexa ao diário uma partida que acabou de ser reforçada.
+
+        Os argumentos são os de `RegistroPartidas.registra`. Chame depois de
+        `jogador.reforcar` (e de registrar o resultado no `historico`).
+        """
+        self._fila.put(("partida", list(casas), resultado, quem_comecou))
+        self._jogos_no_diario += 1
+        if self._jogos_no_diario >= self.jogos_por_checkpoint:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Pede um checkpoint do estado atual do cérebro.
+
+        Só copia o cérebro (rápido); a gravação é feita pela thread.
+        """
+        self.jogador.aplicar_pendentes()
+        jogador = copy.copy(self.jogador)
+        if isinstance(jogador.brain, CerebroDenso):
+            jogador.brain = jogador.brain.copia()
+        else:
+            jogador.brain = {k: dict(v) for k, v in jogador.brain.items()}
+        historico = None
+        if self.historico is not None:
+            historico = Historico.de_resultados(
+                self.historico.resultados, codigos=self.historico.codigos
+            )
+        self._fila.put(("checkpoint", jogador, historico))
+        self._jogos_no_diario = 0
+
+    def _escreve(self):
+        while True:
+            tarefa = self._fila.get()
+            if tarefa is None:
+                break
+            if tarefa[0] == "partida":
+                self._registro.registra(*tarefa[1:])
+                self._registro.flush(sincronizar=True)
+            else:
+                _, jogador, historico = tarefa
+                # o diário novo começa antes do checkpoint ser gravado, então
+                # uma queda no meio do caminho não perde nenhuma partida
+                self._registro.fechar()
+                atual = self._caminho_diario(jogador.num_jogos)
+                self._registro = RegistroPartidas(atual)
+                salva_cerebro(self.caminho, jogador, historico)
+                for inicio, arquivo in self._diarios():
+                    if inicio < jogador.num_jogos:
+                        os.remove(arquivo)
+
+    def fechar(self, checkpoint=True):
+        """Espera a fila esvaziar e fecha o diário.
+
+        Args:
+          checkpoint:
+            Se `True`, grava um último checkpoint antes de fechar.
+        """
+        if checkpoint:
+            self.checkpoint()
+        self._fila.put(None)
+        self._thread.join()
+        self._registro.fechar()
+
+
+# Perfil de desempenho opcional. Quando ativado, os métodos abaixo são
+# trocados por versões que contam chamadas e tempo; desativado, os métodos
+# originais voltam e nada é medido.
+METODOS_PERFILADOS = [
+    (Configuracao, "__init__"),
+    (Configuracao, "check_vitoria"),
+    (ConfiguracaoBits, "check_vitoria"),
+    (TabelaCanonica, "equivalentes"),
+    (TabelaCanonica, "id_canonico"),
+    (EstadoJogo, "__init__"),
+    (EstadoJogo, "terminou"),
+    (EstadoJogo, "jogar"),
+    (Amostrador, "sorteia"),
+    (Amostrador, "reconstroi"),
+    (Jogador, "realizar_jogada"),
+    (Jogador, "escolhe_casa"),
+    (Jogador, "amostrador"),
+    (Jogador, "reforcar"),
+    (Jogador, "reforcar_lote"),
+    (Jogador, "atualizar_vitoria"),
+    (Jogador, "atualizar_derrota"),
+    (Jogador, "atualizar_empate"),
+    (JogadorPerfeito, "escolhe_casa"),
+    (JogadorPerfeito, "reforcar"),
+    (JogadorPerfeito, "reforcar_lote"),
+    (CerebroDenso, "sorteia"),
+    (CerebroDenso, "reforca"),
+    (CerebroEsparso, "sorteia"),
+]
+
+_PERFIL = None
+
+
+class Perfil:
+    """Contadores de um perfil de desempenho (veja `ativa_perfil`).
+
+    Attributes:
+      chamadas:
+        Número de chamadas de cada método perfilado ("Classe.metodo").
+      tempo:
+        Tempo total (s) gasto em cada método, incluindo o das chamadas feitas
+        por ele.
+      reinicios:
+        Número de vezes que uma caixa ficou sem missangas e foi reiniciada.
+      visitas:
+        Número de vezes que cada caixa (ID do tabuleiro canônico) foi usada
+        para sortear uma jogada.
+    """
+
+    def __init__(self):
+        self.chamadas = {}
+        self.tempo = {}
+        self.reinicios = 0
+        self.visitas = {}
+
+    def conta(self, nome, tempo):
+        self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+        self.tempo[nome] = self.tempo.get(nome, 0.0) + tempo
+
+    def visita(self, id_, vezes=1):
+        self.visitas[id_] = self.visitas.get(id_, 0) + vezes
+
+    def instantaneo(self):
+        """Cópia dos contadores em um dicionário simples (serializável)."""
+        return {
+            "chamadas": dict(self.chamadas),
+            "tempo": dict(self.tempo),
+            "reinicios": self.reinicios,
+            "visitas": dict(self.visitas),
+        }
+
+
+def _visita_escolhe_casa(args, retorno):
+    id_ = TABELA.ids[TABELA.canonico[args[1]]]
+    if id_.count("0") > 1:
+        _PERFIL.visita(id_)
+
+
+def _visita_lote(args, retorno):
+    jogadores, jogadas = args[0], retorno[1]
+    for jogador, rodadas in zip(jogadores, jogadas):
+        for _, linhas, _ in rodadas:
+            unicas, vezes = np.unique(linhas, return_counts=True)
+            for linha, n in zip(unicas.tolist(), vezes.tolist()):
+                _PERFIL.visita(jogador.brain.ids[linha], n)
+
+
+def _perfilado(nome, funcao, depois=None):
+    """Versão de `funcao` que soma chamadas e tempo no perfil ativo."""
+
+    def perfilada(*args, **kwargs):
+        inicio = time.perf_counter()
+        retorno = funcao(*args, **kwargs)
+        _PERFIL.conta(nome, time.perf_counter() - inicio)
+        if depois is not None:
+            depois(args, retorno)
+        return retorno
+
+    perfilada.__wrapped__ = funcao
+    perfilada.__doc__ = funcao.__doc__
+    return perfilada
+
+
+def ativa_perfil():
+    """Começa a contar chamadas, tempo, reinícios e visitas de caixas.
+
+    Os métodos de `METODOS_PERFILADOS` (e a simulação em lote) são trocados
+    por versões que medem cada chamada. Enquanto o perfil não está ativo, os
+    métodos originais são usados e o custo é zero.
+
+    Returns:
+      O `Perfil` ativo (o mesmo se já estiver ativo).
+    """
+    global _PERFIL
+    if _PERFIL is not None:
+        return _PERFIL
+
+    _PERFIL = Perfil()
+    for classe, metodo in METODOS_PERFILADOS:
+        # o JogadorPerfeito não sorteia de caixas, então não conta visitas
+        visita = (classe, metodo) == (Jogador, "escolhe_casa")
+        depois = _visita_escolhe_casa if visita else None
+        nome = f"{classe.__name__}.{metodo}"
+        funcao = classe.__dict__[metodo]
+        setattr(classe, metodo, _perfilado(nome, funcao, depois))
+    globals()["_joga_lote"] = _perfilado(
+        "_joga_lote", _joga_lote, _visita_lote
+    )
+    return _PERFIL
+
+
+def desativa_perfil():
+    """Volta aos métodos originais.
+
+    Returns:
+      O `Perfil` que estava ativo (ou `None`).
+    """
+    global _PERFIL
+    perfil, _PERFIL = _PERFIL, None
+    if perfil is not None:
+        for classe, metodo in METODOS_PERFILADOS:
+            setattr(classe, metodo, classe.__dict__[metodo].__wrapped__)
+        globals()["_joga_lote"] = _joga_lote.__wrapped__
+    return perfil
+
+
+def _com_perfil(simula, *args, **kwargs):
+    """Roda uma simulação com o perfil ativo e anexa o instantâneo ao retorno."""
+    ja_ativo = _PERFIL is not None
+    perfil = ativa_perfil()
+    try:
+        retorno = simula(*args, **kwargs)
+    finally:
+        if not ja_ativo:
+            desativa_perfil()
+    return retorno + (perfil.instantaneo(),)
+
+
+def intervalo_wilson(sucessos, jogos, z=1.96):
+    """Intervalo de confiança de Wilson para uma proporção.
+
+    Args:
+      sucessos:
+        Número de jogos com o resultado (por exemplo, vitórias).
+      jogos:
+        Número total de jogos.
+      z:
+        Quantil da normal (1.96 para 95% de confiança).
+
+    Returns:
+      Tupla com os limites inferior e superior da proporção.
+    """
+    if jogos == 0:
+        return 0.0, 1.0
+    taxa = sucessos / jogos
+    centro = taxa + z**2 / (2 * jogos)
+    margem = z * np.sqrt(taxa * (1 - taxa) / jogos + z**2 / (4 * jogos**2))
+    denominador = 1 + z**2 / jogos
+    return (
+        float(max((centro - margem) / denominador, 0.0)),
+        float(min((centro + margem) / denominador, 1.0)),
+    )
+
+
+def probabilidades_cerebro(cerebro):
+    """Matriz (caixas, jogadas) com a chance de cada jogada em cada caixa.
+
+    As linhas seguem a ordem das caixas do cérebro, que só cresce no fim
+    (cérebros sob demanda e esparsos), então duas chamadas podem ser
+    comparadas linha a linha. Retorna `None` para jogadores sem cérebro.
+    """
+    if cerebro is None:
+        return None
+    if not isinstance(cerebro, CerebroDenso):
+        cerebro = CerebroDenso.de_dicionario(cerebro)
+    contagens = cerebro.contagens[: len(cerebro)].astype(float)
+    total = contagens.sum(axis=1, keepdims=True)
+    return contagens / np.maximum(total, 1)
+
+
+class Convergencia:
+    """Estatísticas por janela de jogos e critério de parada do treino.
+
+    A cada `janela` jogos calcula as taxas de vitórias 1, vitórias 2 e
+    empates da janela (com intervalo de Wilson) e quanto as missangas
+    mudaram desde a janela anterior: para cada caixa, a distância de
+    variação total entre as chances das jogadas antes e depois, na média das
+    caixas (vale o jogador que mais mudou). Caixas criadas durante a janela
+    não entram na conta.
+
+    O treino convergiu quando, por `paciencia` janelas seguidas, nenhuma taxa
+    mudou mais que `tolerancia` e a variação das missangas ficou abaixo de
+    `limite_missangas`. Passe uma instância para a `simulacao` ou para a
+    `simulacao_em_lote` para parar nesse ponto.
+
+    Args:
+      janela:
+        Número de jogos de cada janela. Na `simulacao_em_lote` uma janela
+        só fecha no fim de um lote, então ela pode ser maior.
+      tolerancia:
+        Maior mudança de taxa (entre 0 e 1) entre janelas seguidas.
+      limite_missangas:
+        Maior variação média das chances das caixas entre janelas seguidas.
+      paciencia:
+        Número de janelas seguidas dentro dos limites para parar.
+      min_jogos:
+        Não para antes deste número de jogos.
+      z:
+        Quantil da normal dos intervalos de confiança.
+
+    Atributos:
+      janelas:
+        Lista com um dicionário por janela fechada: "jogos" (total até o fim
+        da janela), "taxas" e "intervalos" (vitórias 1, vitórias 2 e
+        empates) e "variacao_missangas".
+      convergiu:
+        `True` depois que o critério de parada foi atingido.
+    """
+
+    def __init__(
+        self,
+        janela=1000,
+        tolerancia=0.02,
+        limite_missangas=0.01,
+        paciencia=3,
+        min_jogos=0,
+        z=1.96,
+    ):
+        self.janela = janela
+        self.tolerancia = tolerancia
+        self.limite_missangas = limite_missangas
+        self.paciencia = paciencia
+        self.min_jogos = min_jogos
+        self.z = z
+        self.jogos = 0
+        self.janelas = []
+        self.convergiu = False
+        self._estaveis = 0
+        self._contagem = [0, 0, 0]
+        self._inicio = 0
+        self._probabilidades = None
+
+    def registra(self, resultado, jogadores):
+        """Conta um jogo (`EMPATE`, 1 ou 2) e fecha a janela se ela acabou.
+
+        Returns:
+          `True` se o treino convergiu e a simulação deve parar.
+        """
+        self._contagem[resultado] += 1
+        self.jogos += 1
+        if self.jogos - self._inicio >= self.janela:
+            return self._fecha_janela(jogadores)
+        return False
+
+    def registra_varios(self, resultados, jogadores):
+        """Mesmo que `registra`, para um array de resultados."""
+        for codigo, vezes in enumerate(np.bincount(resultados, minlength=3)):
+            self._contagem[codigo] += int(vezes)
+        self.jogos += len(resultados)
+        if self.jogos - self._inicio >= self.janela:
+            return self._fecha_janela(jogadores)
+        return False
+
+    def _variacao_missangas(self, jogadores):
+        """Maior variação média das chances das caixas desde a última janela."""
+        atuais = [probabilidades_cerebro(j.brain) for j in jogadores]
+        anteriores, self._probabilidades = self._probabilidades, atuais
+        if anteriores is None:
+            return None
+
+        variacao = 0.0
+        for antes, agora in zip(anteriores, atuais):
+            if antes is None or len(antes) == 0:
+                continue
+            distancia = 0.5 * np.abs(agora[: len(antes)] - antes).sum(axis=1)
+            variacao = max(variacao, float(distancia.mean()))
+        return variacao
+
+    def _fecha_janela(self, jogadores):
+        jogos = self.jogos - self._inicio
+        vitorias1, vitorias2 = self._contagem[1], self._contagem[2]
+        contagens = [vitorias1, vitorias2, self._contagem[EMPATE]]
+        janela = {
+            "jogos": self.jogos,
+            "taxas": [c / jogos for c in contagens],
+            "intervalos": [
+                intervalo_wilson(c, jogos, self.z) for c in contagens
+            ],
+            "variacao_missangas": self._variacao_missangas(jogadores),
+        }
+
+        if self.janelas and janela["variacao_missangas"] is not None:
+            mudanca = max(
+                abs(agora - antes)
+                for agora, antes in zip(
+                    janela["taxas"], self.janelas[-1]["taxas"]
+                )
+            )
+            estavel = (
+                mudanca <= self.tolerancia
+                and janela["variacao_missangas"] <= self.limite_missangas
+            )
+            self._estaveis = self._estaveis + 1 if estavel else 0
+
+        self.janelas.append(janela)
+        self._contagem = [0, 0, 0]
+        self._inicio = self.jogos
+        self.convergiu = (
+            self._estaveis >= self.paciencia and self.jogos >= self.min_jogos
+        )
+        return self.convergiu
+
+
+def simulacao(
+    player1,
+    player2,
+    num_jogos=100,
+    historico=None,
+    registro=None,
+    perfil=False,
+    convergencia=None,
+):
+    """Simula `num_jogos` jogos entre dois jogadores, um de cada vez.
+
+    Args:
+      player1, player2:
+        Jogadores (instâncias de `Jogador`). `player1` começa todos os jogos.
+        Se eles tiverem `regras`, os jogos usam `EstadoTabuleiro`.
+      num_jogos:
+        Número de jogos.
+      historico:
+        Instância de `Historico` onde os resultados são registrados. Se for
+        `None`, um novo é criado.
+      registro:
+        Instância opcional de `RegistroPartidas` onde cada jogo é gravado
+        (só jogos 3x3).
+      perfil:
+        Se `True`, roda com o perfil de desempenho ativo (veja `ativa_perfil`)
+        e retorna também o instantâneo dos contadores. Se o perfil já estava
+        ativo, os contadores incluem o que foi medido antes.
+      convergencia:
+        Instância opcional de `Convergencia`. Se for passada, a simulação
+        para antes de `num_jogos` quando o treino convergir (o número de
+        jogos jogados é o tamanho das curvas menos um).
+
+    Returns:
+      Os dois jogadores e as curvas acumuladas de vitórias 1, vitórias 2 e
+      empates (veja `Historico.curvas`). Com `perfil=True`, também o
+      instantâneo do perfil (veja `Perfil.instantaneo`).
+    """
+    if perfil:
+        return _com_perfil(
+            simulacao,
+            player1,
+            player2,
+            num_jogos,
+            historico,
+            registro,
+            convergencia=convergencia,
+        )
+
+    jogadores = [player1, player2]
+    historico = (
+        Historico(capacidade=num_jogos) if historico is None else historico
+    )
+
+    regras = getattr(player1, "regras", None)
+    novo_estado = EstadoJogo
+    if regras is not None:
+        assert registro is None, "O registro de partidas só guarda jogos 3x3"
+        novo_estado = partial(EstadoTabuleiro, regras)
+
+    for _ in range(num_jogos):
+        estado = novo_estado()
+        jogador_da_vez = False
+
+        while not estado.terminou():
+            estado = jogadores[jogador_da_vez].realizar_jogada(estado, False)
+            jogador_da_vez = not jogador_da_vez
+
+        if estado.resultado == 1:
+            jogadores[0].reforcar("vitoria")
+            jogadores[1].reforcar("derrota")
+
+        elif estado.resultado == 2:
+            jogadores[1].reforcar("vitoria")
+            jogadores[0].reforcar("derrota")
+
+        else:
+            jogadores[1].reforcar("empate")
+            jogadores[0].reforcar("empate")
+
+        historico.registra(estado.resultado)
+        if registro is not None:
+            registro.registra(estado.casas, estado.resultado)
+        if convergencia is not None and convergencia.registra(
+            estado.resultado, jogadores
+        ):
+            break
+
+    for jogador in jogadores:
+        jogador.aplicar_pendentes()
+
+    vitorias1, vitorias2, empates = historico.curvas()
+
+    return player1, player2, vitorias1, vitorias2, empates
+
+
+VITORIA_MASCARA_ARRAY = np.array(VITORIA_MASCARA)
+
+
+def simulacao_em_lote(
+    player1,
+    player2,
+    num_jogos=100,
+    tamanho_lote=1000,
+    semente=None,
+    historico=None,
+    registro=None,
+    perfil=False,
+    reforcar=True,
+    convergencia=None,
+):
+    """Simula vários jogos de uma vez, com os tabuleiros em arrays do NumPy.
+
+    Os `tamanho_lote` jogos de um lote andam juntos, jogada a jogada: sorteio
+    das jogadas, checagem de vitória e empate são feitos para o lote todo de
+    uma vez. Os cérebros só são reforçados ao final de cada lote (todos os
+    jogos do lote usam o mesmo cérebro), então com `tamanho_lote=1` o
+    resultado é equivalente ao da `simulacao`.
+
+    Args:
+      player1, player2:
+        Instâncias de `Jogador`. Os cérebros são convertidos para
+        `CerebroDenso` (veja `Jogador.para_denso`).
+      num_jogos:
+        Número total de jogos.
+      tamanho_lote:
+        Número de jogos simulados juntos.
+      semente:
+        Semente do gerador de números aleatórios do NumPy.
+      historico:
+        Instância de `Historico` onde os resultados são registrados. Se for
+        `None`, um novo é criado.
+      registro:
+        Instância opcional de `RegistroPartidas` onde cada jogo é gravado.
+      perfil:
+        Veja `simulacao`.
+      reforcar:
+        Se `False`, os cérebros não são reforçados (jogadores congelados,
+        como em um torneio).
+      convergencia:
+        Veja `simulacao`. A checagem é feita ao final de cada lote.
+
+    Returns:
+      Mesmo retorno da `simulacao`.
+    """
+
+    if perfil:
+        return _com_perfil(
+            simulacao_em_lote,
+            player1,
+            player2,
+            num_jogos,
+            tamanho_lote,
+            semente,
+            historico,
+            registro,
+            reforcar=reforcar,
+            convergencia=convergencia,
+        )
+
+    assert getattr(player1, "regras", None) is None, "Só para jogos 3x3"
+    rng = np.random.default_rng(semente)
+    jogadores = [player1, player2]
+    for jogador in jogadores:
+        jogador.para_denso()
+
+    if historico is None:
+        historico = Historico(capacidade=num_jogos)
+
+    for inicio in range(0, num_jogos, tamanho_lote):
+        lote = min(tamanho_lote, num_jogos - inicio)
+        resultado, jogadas, sequencia = _joga_lote(jogadores, lote, rng)
+        historico.registra_varios(resultado)
+        if registro is not None:
+            registro.registra_varios(sequencia, resultado)
+
+        # reforço em lote, com um valor de reforço por jogada
+        for num, jogador in enumerate(jogadores, start=1):
+            if not reforcar or not jogadas[num - 1]:
+                continue
+            jogos, linhas, colunas = map(
+                np.concatenate, zip(*jogadas[num - 1])
+            )
+            reforcos = np.array(
+                [
+                    jogador.reforco_empate,
+                    jogador.reforco_derrota,
+                    jogador.reforco_derrota,
+                ]
+            )
+            # resultado 0 é empate, `num` é vitória e o outro é derrota
+            reforcos[num] = jogador.reforco_vitoria
+            jogador.brain.reforca(
+                linhas,
+                colunas,
+                reforcos[resultado[jogos]],
+                jogador.valor_inicial,
+            )
+            jogador.num_jogos += lote
+
+        if convergencia is not None and convergencia.registra_varios(
+            resultado, jogadores
+        ):
+            break
+
+    vitorias1, vitorias2, empates = historico.curvas()
+
+    return player1, player2, vitorias1, vitorias2, empates
+
+
+def _joga_lote(jogadores, lote, rng):
+    """Joga `lote` jogos em paralelo sem reforçar os cérebros.
+
+    Returns:
+      Array com o resultado de cada jogo (0 empate, 1 ou 2 quem ganhou), para
+      cada jogador uma lista de tuplas (jogos, linhas, colunas) com as jogadas
+      sorteadas em cada rodada, e o array (lote, 9) com as casas jogadas em
+      ordem (-1 depois do fim do jogo).
+    """
+
+    sequencia = np.full((lote, 9), -1, dtype=np.int8)
+    codigos = np.zeros(lote, dtype=np.int64)
+    mascaras = np.zeros((2, lote), dtype=np.int64)
+    resultado = np.zeros(lote, dtype=np.int8)
+    ativos = np.arange(lote)
+    jogadas = [[], []]
+
+    for rodada in range(9):
+        if len(ativos) == 0:
+            break
+
+        vez = rodada % 2
+        cod = codigos[ativos]
+        canonico = TABELA.canonico[cod]
+
+        if rodada == 8:
+            # apenas uma jogada a ser feita, não temos escolha
+            casas = np.argmax(TABELA.tabuleiros[cod] == 0, axis=1)
+
+        else:
+            cerebro = jogadores[vez].brain
+            linhas = cerebro.linha_por_codigo()[canonico]
+
+            # sorteia a jogada proporcionalmente às missangas
+            acumulado = np.cumsum(cerebro.contagens[linhas], axis=1)
+            sorteio = rng.random(len(ativos)) * acumulado[:, -1]
+            colunas = (acumulado <= sorteio[:, None]).sum(axis=1)
+            jogadas[vez].append((ativos, linhas, colunas))
+
+            # sorteia entre as casas equivalentes (no tabuleiro canônico)
+            equivalentes = TABELA.mapa[canonico] == colunas[:, None] + 1
+            pesos = np.where(equivalentes, rng.random((len(ativos), 9)), -1)
+            casas = TABELA.perm[cod, np.argmax(pesos, axis=1)]
+
+        sequencia[ativos, rodada] = casas
+        codigos[ativos] += (vez + 1) * POTENCIAS_3[casas]
+        mascaras[vez, ativos] |= np.left_shift(1, casas.astype(np.int64))
+
+        venceu = VITORIA_MASCARA_ARRAY[mascaras[vez, ativos]]
+        resultado[ativos[venceu]] = vez + 1
+        ativos = ativos[~venceu]
+
+    return resultado, jogadas, sequencia
 
 
 def plot(
@@ -0,0 +1,300 @@
+"""
+Benchmarks dos caminhos mais usados da `api`.
+
+Cada benchmark roda com sementes fixas e o resultado sai em JSON, para comparar
+commits diferentes. Para rodar a partir da pasta do repositório:
+
+    python -m files.benchmark --saida benchmark.json
+
+Use `--apenas` para escolher alguns benchmarks (veja `BENCHMARKS`).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from files.api import (
+    Configuracao,
+    Jogador,
+    carrega_cerebro,
+    salva_cerebro,
+    simulacao,
+    simulacao_em_lote,
+)
+
+
+def mede(funcao, numero, repeticoes=5, preparo=None):
+    """Mede o tempo de `funcao`, chamada `numero` vezes por repetição.
+
+    Args:
+        funcao (callable): função medida; recebe o que `preparo` devolver
+        numero (int): número de chamadas em cada repetição
+        repeticoes (int): número de repetições; o resultado usa a melhor
+        preparo (callable): chamada antes de cada chamada de `funcao`, fora da
+    medida. Se for `None`, `funcao` é chamada sem argumentos.
+
+    Returns:
+        resultado (dict): microssegundos por chamada (melhor repetição e
+    mediana) e chamadas por segundo na melhor repetição
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        total = 0.0
+        for _ in range(numero):
+            argumentos = (preparo(),) if preparo else ()
+            inicio = time.perf_counter()
+            funcao(*argumentos)
+            total += time.perf_counter() - inicio
+        tempos.append(total / numero)
+
+    melhor = min(tempos)
+    return {
+        "us_por_chamada": melhor * 1e6,
+        "us_mediana": float(np.median(tempos)) * 1e6,
+        "por_segundo": 1 / melhor,
+        "numero": numero,
+        "repeticoes": repeticoes,
+    }
+
+
+def tabuleiros(quantidade, vez=None):
+    """Sorteia tabuleiros alcançáveis em jogos aleatórios (sem vitórias).
+
+    Args:
+        quantidade (int): número de tabuleiros
+        vez (int): se 1 ou 2, só tabuleiros onde é a vez desse jogador e há
+    pelo menos duas casas vazias
+
+    Returns:
+        tabuleiros (list): lista de strings de 9 caracteres
+    """
+    saida = []
+    while len(saida) < quantidade:
+        casas = [0] * 9
+        ordem = random.sample(range(9), 9)
+        for rodada, casa in enumerate(ordem):
+            config = Configuracao(casas)
+            if config.check_vitoria(1) or config.check_vitoria(2):
+                break
+            if vez is None or (rodada % 2 == vez - 1 and rodada <= 7):
+                saida.append("".join(map(str, casas)))
+            casas[casa] = rodada % 2 + 1
+    return saida[:quantidade]
+
+
+def bench_configuracao(repeticoes):
+    pool = tabuleiros(1000)
+    iterador = iter(pool * (repeticoes + 1))
+    return mede(lambda: Configuracao(next(iterador)), 1000, repeticoes)
+
+
+def bench_get_symmetry_id(repeticoes):
+    configs = iter([Configuracao(t) for t in tabuleiros(1000)] * repeticoes)
+    return mede(lambda: next(configs).get_symmetry_id(), 1000, repeticoes)
+
+
+def bench_symmetry_map(repeticoes):
+    configs = iter([Configuracao(t) for t in tabuleiros(1000)] * repeticoes)
+    return mede(lambda: next(configs).symmetry_map(), 1000, repeticoes)
+
+
+def bench_check_vitoria(repeticoes):
+    configs = iter([Configuracao(t) for t in tabuleiros(1000)] * repeticoes)
+    return mede(lambda: next(configs).check_vitoria(1), 1000, repeticoes)
+
+
+def bench_jogador(repeticoes):
+    Jogador(2)  # o primeiro carrega o cache de estados do disco
+    return mede(lambda: Jogador(2), 20, repeticoes)
+
+
+def bench_jogador_sem_cache(repeticoes):
+    return mede(lambda: Jogador(2, usar_cache=False), 3, repeticoes)
+
+
+def _bench_realizar_jogada(repeticoes, return_prob, cerebro="dicionario"):
+    jogador = Jogador(1, cerebro=cerebro)
+    pool = iter(tabuleiros(1000, vez=1) * repeticoes)
+
+    def joga():
+        jogador.realizar_jogada(next(pool), return_prob=return_prob)
+        jogador.jogadas.clear()
+
+    return mede(joga, 1000, repeticoes)
+
+
+def bench_realizar_jogada(repeticoes):
+    return _bench_realizar_jogada(repeticoes, False)
+
+
+def bench_realizar_jogada_prob(repeticoes):
+    return _bench_realizar_jogada(repeticoes, True)
+
+
+def bench_realizar_jogada_denso(repeticoes):
+    return _bench_realizar_jogada(repeticoes, False, "denso")
+
+
+def _bench_atualizar(repeticoes, resultado):
+    jogador = Jogador(1)
+    atualiza = getattr(jogador, f"atualizar_{resultado}")
+    pool = tabuleiros(1000, vez=1)
+
+    def joga_partida():
+        # quatro jogadas, como em uma partida inteira do jogador 1
+        for tabuleiro in random.sample(pool, 4):
+            jogador.realizar_jogada(tabuleiro)
+
+    return mede(lambda _: atualiza(), 1000, repeticoes, joga_partida)
+
+
+def bench_atualizar_vitoria(repeticoes):
+    return _bench_atualizar(repeticoes, "vitoria")
+
+
+def bench_atualizar_derrota(repeticoes):
+    return _bench_atualizar(repeticoes, "derrota")
+
+
+def bench_atualizar_empate(repeticoes):
+    return _bench_atualizar(repeticoes, "empate")
+
+
+def _bench_simulacao(repeticoes, cerebro, num_jogos=2000):
+    def simula():
+        simulacao(
+            Jogador(1, cerebro=cerebro), Jogador(2, cerebro=cerebro), num_jogos
+        )
+
+    resultado = mede(simula, 1, repeticoes)
+    resultado["jogos_por_segundo"] = num_jogos * resultado["por_segundo"]
+    return resultado
+
+
+def bench_simulacao(repeticoes):
+    return _bench_simulacao(repeticoes, "dicionario")
+
+
+def bench_simulacao_denso(repeticoes):
+    return _bench_simulacao(repeticoes, "denso")
+
+
+def bench_simulacao_em_lote(repeticoes, num_jogos=100000):
+    semente = iter(range(repeticoes))
+
+    def simula():
+        simulacao_em_lote(
+            Jogador(1, cerebro="denso"),
+            Jogador(2, cerebro="denso"),
+            num_jogos,
+            semente=next(semente),
+        )
+
+    resultado = mede(simula, 1, repeticoes)
+    resultado["jogos_por_segundo"] = num_jogos * resultado["por_segundo"]
+    return resultado
+
+
+def bench_salva_cerebro(repeticoes):
+    jogador = Jogador(2)
+    simulacao(Jogador(1), jogador, 500)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "brain.npz")
+        return mede(lambda: salva_cerebro(caminho, jogador), 20, repeticoes)
+
+
+def bench_carrega_cerebro(repeticoes):
+    jogador = Jogador(2)
+    simulacao(Jogador(1), jogador, 500)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "brain.npz")
+        salva_cerebro(caminho, jogador)
+        return mede(lambda: carrega_cerebro(caminho, jogador), 20, repeticoes)
+
+
+BENCHMARKS = {
+    nome[len("bench_") :]: funcao
+    for nome, funcao in list(globals().items())
+    if nome.startswith("bench_")
+}
+
+
+def versao_git():
+    """Commit atual do repositório (com "+" se houver mudanças), ou `None`."""
+    try:
+        commit = subprocess.run(
+            ["git", "describe", "--always", "--dirty=+"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit
+
+
+def roda(nomes=None, repeticoes=5, semente=0, verbose=True):
+    """Roda os benchmarks.
+
+    Antes de cada benchmark os geradores aleatórios (`random` e `np.random`)
+    recebem a mesma `semente`, então os tabuleiros e jogos sorteados são
+    sempre os mesmos.
+
+    Args:
+        nomes (list): benchmarks a rodar (veja `BENCHMARKS`); todos se `None`
+        repeticoes (int): repetições de cada medida (vale a melhor)
+        semente (int): semente dos geradores aleatórios
+        verbose (bool): se `True`, printa cada resultado
+
+    Returns:
+        saida (dict): informações da máquina e o resultado de cada benchmark
+    """
+    saida = {
+        "commit": versao_git(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "semente": semente,
+        "resultados": {},
+    }
+
+    for nome in nomes or BENCHMARKS:
+        random.seed(semente)
+        np.random.seed(semente)
+        resultado = BENCHMARKS[nome](repeticoes)
+        saida["resultados"][nome] = resultado
+        if verbose:
+            extra = ""
+            if "jogos_por_segundo" in resultado:
+                extra = f", {resultado['jogos_por_segundo']:.0f} jogos/s"
+            print(
+                f"{nome:>24}: {resultado['us_por_chamada']:12.1f} us "
+                f"({resultado['por_segundo']:.1f}/s{extra})"
+            )
+
+    return saida
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--saida", default=None, help="arquivo JSON")
+    parser.add_argument("--apenas", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    saida = roda(args.apenas, args.repeticoes, args.semente)
+    texto = json.dumps(saida, indent=2)
+    if args.saida:
+        with open(args.saida, "w") as handle:
+            handle.write(texto)
+    else:
+        print(texto)
@@ -0,0 +1,82 @@
+"""
+Converte os cérebros antigos (brain_*.pickle e history_*.pickle) para o formato
+.npz do `salva_cerebro`.
+
+Para converter todos os cérebros de files/assets/dados (veja o GUIA.md), a
+partir da pasta do repositório:
+
+    python -m files.converte_pickles
+
+Também aceita uma lista de arquivos brain_*.pickle.
+"""
+
+import glob
+import os
+import pickle
+import sys
+
+from files.api import (
+    CODIGOS_ADVERSARIO,
+    CerebroDenso,
+    Historico,
+    Jogador,
+    salva_cerebro,
+)
+
+PASTA_DADOS = "files/assets/dados"
+
+
+def detecta_player_num(brain):
+    """Descobre se o cérebro é do jogador 1 ou 2 pelas peças das caixas."""
+    id_ = next(iter(brain))
+    return 1 if id_.count("1") == id_.count("2") else 2
+
+
+def converte(caminho_brain, caminho_saida=None):
+    """
+    Converte um brain_*.pickle (e o history_*.pickle correspondente, se houver).
+
+    Os parâmetros de reforço com que os cérebros foram treinados não foram
+    salvos nos pickles, então os metadados usam os valores padrão do Jogador.
+
+    Args:
+        caminho_brain (str): arquivo brain_*.pickle
+        caminho_saida (str): arquivo .npz de saída; por padrão, o mesmo nome
+    com extensão .npz
+
+    Returns:
+        caminho_saida (str): arquivo gerado
+    """
+    if caminho_saida is None:
+        caminho_saida = os.path.splitext(caminho_brain)[0] + ".npz"
+
+    with open(caminho_brain, "rb") as handle:
+        brain = pickle.load(handle)
+
+    caminho_history = os.path.join(
+        os.path.dirname(caminho_brain),
+        os.path.basename(caminho_brain).replace("brain", "history", 1),
+    )
+    historico = None
+    if os.path.exists(caminho_history):
+        with open(caminho_history, "rb") as handle:
+            # o placar da interface: vitórias do jogador, do MENACE e empates
+            historico = Historico.de_curvas(
+                *pickle.load(handle), codigos=CODIGOS_ADVERSARIO
+            )
+
+    jogador = Jogador(detecta_player_num(brain), cerebro="denso")
+    jogador.brain = CerebroDenso.de_dicionario(brain)
+    if historico is not None:
+        jogador.num_jogos = historico.num_jogos
+
+    salva_cerebro(caminho_saida, jogador, historico)
+    return caminho_saida
+
+
+if __name__ == "__main__":
+    arquivos = sys.argv[1:] or sorted(
+        glob.glob(os.path.join(PASTA_DADOS, "brain_*.pickle"))
+    )
+    for arquivo in arquivos:
+        print(f"{arquivo} -> {converte(arquivo)}")
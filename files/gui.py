@@ -9,14 +9,23 @@ implementação da interface gráfica do MENACE!
 # ---------------------------------------------------------------------------- #
 
 # ------------------------------- Importações: ------------------------------- #
-import pygame, pickle
+import contextlib
+import json
+import pygame
+import random as rnd
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from files.api import *
 from pygame import mixer
 
 # -------------------------------- Utilidades: ------------------------------- #
 scale_factor = 10  # para os sprites
-brain_save_path = "files/assets/brain.pickle"
-history_save_path = "files/assets/history.pickle"
+brain_save_path = "files/assets/brain.npz"
+games_log_path = "files/assets/partidas.bin"
+instrumentation_path = "files/assets/instrumentacao.json"
 DISPLAY_W, DISPLAY_H = 1280, 960
 display_center = (DISPLAY_W / 2, DISPLAY_H / 2)
 isX_constant = True
@@ -34,6 +43,56 @@ snd_draw = mixer.Sound("files/assets/audios/draw.mp3")
 # ---------------------------------------------------------------------------- #
 
 
+@lru_cache(maxsize=None)
+def carrega_folha(file):
+    """
+    Carrega (uma única vez) uma imagem de spritesheet, no tamanho original.
+
+    Args:
+        file (str): local do arquivo da spritesheet
+
+    Returns:
+        sheet (pygame.Surface): superfície/sprite do pygame com a folha inteira
+    """
+    return pygame.image.load(file).convert_alpha()
+
+
+@lru_cache(maxsize=None)
+def recorta_sprites(size, file):
+    """
+    Recorta uma spritesheet em sprites individuais, no tamanho original. As
+    superfícies são compartilhadas entre todos que pedirem a mesma folha.
+
+    Args:
+        size (tup): (width, height) de cada sprite individual
+        file (str): local do arquivo da spritesheet
+
+    Returns:
+        sprites (tuple): tupla de superfícies/sprites do pygame
+    """
+    w, h = size
+    sheet = carrega_folha(file)
+    return tuple(
+        sheet.subsurface(pygame.Rect(x, 0, w, h))
+        for x in range(0, sheet.get_width() - w + 1, w)
+    )
+
+
+@lru_cache(maxsize=None)
+def escala(sprite):
+    """
+    Aumenta um sprite por scale_factor, uma única vez: os sprites aumentados
+    ficam guardados. As aberturas não passam por aqui (veja aumenta_abertura).
+
+    Args:
+        sprite (pygame.Surface): sprite no tamanho original (de recorta_sprites)
+
+    Returns:
+        sprite (pygame.Surface): sprite aumentado
+    """
+    return pygame.transform.scale_by(sprite, scale_factor)
+
+
 def get_sprites(size, file):
     """
     Transforma uma imagem de spritesheet numa lista de sprites do pygame individuais.
@@ -45,18 +104,79 @@ def get_sprites(size, file):
     Returns:
         sprites (list): lista de superfícies/sprites do pygame
     """
-    w, h = size
-    x, y = (0, 0)
-    sheet = pygame.image.load(file).convert_alpha()
-    sheet_rect = sheet.get_rect()
-    sprites = []
-    for _ in range(0, sheet_rect.width - w + 1, w):
-        sheet.set_clip(pygame.Rect(x, y, w, h))
-        sprite = sheet.subsurface(sheet.get_clip())
-        sprite = pygame.transform.scale_by(sprite, scale_factor)
-        sprites.append(sprite)
-        x += w
-    return sprites
+    return [escala(sprite) for sprite in recorta_sprites(size, file)]
+
+
+def precarrega_sprites():
+    """
+    Carrega e recorta todas as spritesheets do jogo e já aumenta os sprites usados
+    em toda partida, para que nada disso aconteça no meio de uma animação. Deve
+    ser chamada depois de pygame.display.set_mode.
+    """
+    folhas = [
+        ((19, 19), "spr_caixinha.png"),
+        ((19, 19), "spr_OsAndXs.png"),
+        ((6, 4), "spr_bead.png"),
+        ((80, 22), "spr_voceVenceu.png"),
+        ((80, 22), "spr_vocePerdeu.png"),
+        ((80, 22), "spr_empate.png"),
+        ((100, 100), "spr_embaralhando.png"),
+    ]
+    for size, file in folhas:
+        get_sprites(size, "files/assets/sprites/" + file)
+    # as aberturas são grandes demais para aumentar todas de antemão; ficam
+    # recortadas e são aumentadas em segundo plano (veja aumenta_abertura)
+    for num in range(1, 10):
+        recorta_sprites(
+            (100, 100), f"files/assets/sprites/spr_opening_{num}.png"
+        )
+
+
+# Aberturas aumentadas guardadas (as mais recentes). Cada uma ocupa ~100 MB
+# (25 quadros diferentes de 1000x1000), então não dá para guardar as 9.
+ABERTURAS_GUARDADAS = 2
+_aberturas = OrderedDict()  # num -> Future com a tupla de quadros aumentados
+_aumentador = ThreadPoolExecutor(max_workers=1)
+
+
+def aumenta_abertura(num):
+    """
+    Aumenta os quadros da animação de abertura de uma caixa em uma thread
+    separada, para que isso não aconteça no loop do jogo. As últimas
+    ABERTURAS_GUARDADAS aberturas ficam guardadas.
+
+    Args:
+        num (int): número da caixa (1 a 9) aberta na animação
+
+    Returns:
+        futuro (concurrent.futures.Future): resultado é a tupla com os
+    quadros aumentados
+    """
+    futuro = _aberturas.get(num)
+    if futuro is None:
+        sprites = recorta_sprites(
+            (100, 100), f"files/assets/sprites/spr_opening_{num}.png"
+        )
+        futuro = _aumentador.submit(_aumenta_quadros, sprites)
+        _aberturas[num] = futuro
+    _aberturas.move_to_end(num)
+    while len(_aberturas) > ABERTURAS_GUARDADAS:
+        _aberturas.popitem(last=False)
+    return futuro
+
+
+def _aumenta_quadros(sprites):
+    # quadros repetidos (as pausas da animação) são aumentados uma vez só
+    aumentados = {}
+    quadros = []
+    for sprite in sprites:
+        pixels = pygame.image.tobytes(sprite, "RGBA")
+        if pixels not in aumentados:
+            aumentados[pixels] = pygame.transform.scale_by(
+                sprite, scale_factor
+            )
+        quadros.append(aumentados[pixels])
+    return tuple(quadros)
 
 
 def get_bead(num):
@@ -71,15 +191,8 @@ def get_bead(num):
     Returns:
         sprite (pygame.Surface): superfície/sprite do pygame da miçanga
     """
-    w, h = (6, 4)
-    x, y = ((num - 1) * w, 0)
-    sheet = pygame.image.load(
-        "files/assets/sprites/spr_bead.png"
-    ).convert_alpha()
-    sheet.set_clip(pygame.Rect(x, y, w, h))
-    sprite = sheet.subsurface(sheet.get_clip())
-    sprite = pygame.transform.scale_by(sprite, scale_factor)
-    return sprite
+    beads = recorta_sprites((6, 4), "files/assets/sprites/spr_bead.png")
+    return escala(beads[num - 1])
 
 
 def get_string(grupo_caixas):
@@ -109,8 +222,8 @@ def atualizar_tela(
         grupo_caixas (pygame.sprite.Group): grupo de caixas (objetos da classe Caixinhas,
     do tipo pygame.sprite.Sprite) que descrevem o tabuleiro
         jogada_antiga (str): string representando a jogada anterior à atual.
-        jogada_atual (api.Configuracao): instância de Configuracao representando a
-    jogada atual
+        jogada_atual (api.EstadoJogo): estado do jogo (ou instância de Configuracao)
+    representando a jogada atual
         prob (arr): array com as probabilidades de cada casa ser jogada (antes da jogada)
     ser realizada
         grupo_probs (pygame.sprite.Group): grupo das probabilidades (instâncias da classe
@@ -119,9 +232,7 @@ def atualizar_tela(
     """
     for n, sprite in enumerate(grupo_probs):
         probabilidade = prob[n]
-        sprite.text = sprite.font.render(
-            f"{probabilidade*100:.2f}%", True, (255, 255, 255)
-        )
+        sprite.change_text(f"{probabilidade*100:.2f}%")
     for caixa, valor_antigo, valor_atual in zip(
         grupo_caixas, jogada_antiga, jogada_atual.lista
     ):
@@ -129,7 +240,7 @@ def atualizar_tela(
             caixa.change_value(valor_atual)
 
 
-def vitoria(quem_ganhou, lista_de_listas, anim_grupo, pausado, menace=None):
+def vitoria(quem_ganhou, historico, anim_grupo, pausado, menace=None):
     """
     Função ativada quando alguém ganha; atualiza dados do menace e anima a cena
     correspondente.
@@ -137,7 +248,8 @@ def vitoria(quem_ganhou, lista_de_listas, anim_grupo, pausado, menace=None):
     Args:
         quem_ganhou: string 'p' caso o jogador tenha ganhado; instância do menace
     caso omenace tenha ganhado
-        lista_de_listas (list): lista contendo as listas de vitória, derrota e empate
+        historico (api.Historico): histórico de vitórias do jogador, vitórias do
+    MENACE e empates
         anim_grupo (pygame.sprite.Group): grupo de cenas animadas (instâncias da classe
     CenaAnimada)
         pausado (list): lista com os valores booleanos de pausa utilizados para animações
@@ -146,11 +258,9 @@ def vitoria(quem_ganhou, lista_de_listas, anim_grupo, pausado, menace=None):
     """
     global snd_win, snd_lose
 
-    lista_jogador, lista_menace, lista_empates = lista_de_listas
     if quem_ganhou == "p":
-        menace.atualizar_derrota()
-        lista_jogador.append(lista_jogador[-1] + 1)
-        lista_menace.append(lista_menace[-1])
+        menace.reforcar("derrota")
+        historico.registra(1)
         # Animação:
         cena_voce_ganhou = CenaAnimada(
             display_center, (80, 22), "spr_voceVenceu.png"
@@ -160,9 +270,8 @@ def vitoria(quem_ganhou, lista_de_listas, anim_grupo, pausado, menace=None):
         print("Você ganhou!")
         snd_win.play()
     else:
-        quem_ganhou.atualizar_vitoria()
-        lista_jogador.append(lista_jogador[-1])
-        lista_menace.append(lista_menace[-1] + 1)
+        quem_ganhou.reforcar("vitoria")
+        historico.registra(2)
         # Animação:
         cena_voce_perdeu = CenaAnimada(
             display_center, (80, 22), "spr_vocePerdeu.png"
@@ -171,25 +280,26 @@ def vitoria(quem_ganhou, lista_de_listas, anim_grupo, pausado, menace=None):
         cena_voce_perdeu.animando = 60
         print("MENACE ganhou!")
         snd_lose.play()
-    lista_empates.append(lista_empates[-1])
     pausado[0] = True
     pausado[1] = 300
 
 
-def empate(lista_de_listas, anim_grupo, pausado):
+def empate(historico, anim_grupo, pausado, menace=None):
     """
     Função ativada quando o jogo empata; atualiza dados do menace e anima a cena.
 
     Args:
-        lista_de_listas (list): lista contendo as listas de vitória, derrota e empate
+        historico (api.Historico): histórico de vitórias do jogador, vitórias do
+    MENACE e empates
         anim_grupo (pygame.sprite.Group): grupo de cenas animadas (instâncias da classe
     CenaAnimada)
         pausado (list): lista com os valores booleanos de pausa utilizados para animações
+        menace (gui.Menace.menace, optional): instância do menace, cujas jogadas da
+    partida são reforçadas como empate
     """
-    lista_jogador, lista_menace, lista_empates = lista_de_listas
-    lista_jogador.append(lista_jogador[-1])
-    lista_menace.append(lista_menace[-1])
-    lista_empates.append(lista_empates[-1] + 1)
+    if menace is not None:
+        menace.reforcar("empate")
+    historico.registra(EMPATE)
     # Animação:
     cena_empate = CenaAnimada(display_center, (80, 22), "spr_empate.png")
     anim_grupo.add(cena_empate)
@@ -200,6 +310,34 @@ def empate(lista_de_listas, anim_grupo, pausado):
     snd_draw.play()
 
 
+def mostrar(sprites, visivel):
+    """
+    Mostra ou esconde sprites desenhados por um pygame.sprite.LayeredDirty. Só
+    marca para redesenho os sprites que de fato mudaram de visibilidade.
+
+    Args:
+        sprites (iterable): sprites (do tipo pygame.sprite.DirtySprite)
+        visivel (bool): se os sprites devem aparecer na tela
+    """
+    for sprite in sprites:
+        if sprite.visible != visivel:
+            sprite.visible = visivel
+
+
+def memoria_maxima():
+    """
+    Devolve o pico de memória residente do processo em MB, ou None se o sistema
+    não informar (o módulo resource não existe no Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB e macOS em bytes
+    return pico / (1024**2 if sys.platform == "darwin" else 1024)
+
+
 def reset_game(grupo_caixas):
     """
     Reseta o jogo, "zerando" as caixinhas do tabuleiro.
@@ -259,7 +397,7 @@ def konami(events, current):
 # ---------------------------------------------------------------------------- #
 
 
-class Caixinhas(pygame.sprite.Sprite):
+class Caixinhas(pygame.sprite.DirtySprite):
     """
     Representa cada casa/posição no tabuleiro do jogo. Seu valor é alterado quando um
     jogador interage com uma instância da mesma.
@@ -296,7 +434,7 @@ class Caixinhas(pygame.sprite.Sprite):
         events,
         menace,
         grupo_caixas,
-        lista_de_listas,
+        historico,
         anim_grupo,
         pausado,
         grupo_probs,
@@ -305,12 +443,15 @@ class Caixinhas(pygame.sprite.Sprite):
             return
         mouse_pos = pygame.mouse.get_pos()
         hover = self.rect.collidepoint(mouse_pos)
-        self.image = self.sprites[1] if hover else self.sprites[0]
-        # Checa jogada:
+        imagem = self.sprites[1] if hover else self.sprites[0]
+        if imagem != self.image:
+            self.image = imagem
+            self.dirty = 1
+        # Checa jogada (pela posição do clique, que pode vir de um robô):
         for event in events:
             if (
                 event.type == pygame.MOUSEBUTTONDOWN
-                and hover
+                and self.rect.collidepoint(event.pos)
                 and (not pausado[0])
                 and (not pausado[1])
                 and (len(anim_grupo) == 0)
@@ -318,7 +459,7 @@ class Caixinhas(pygame.sprite.Sprite):
                 self.change_value(isX_constant + 1)
                 menace.jogada(
                     grupo_caixas,
-                    lista_de_listas,
+                    historico,
                     anim_grupo,
                     pausado,
                     grupo_probs,
@@ -330,9 +471,10 @@ class Caixinhas(pygame.sprite.Sprite):
         else:
             self.image = self.sprites[valor + 1]
         self.value = valor
+        self.dirty = 1
 
 
-class OsAndXs(pygame.sprite.Sprite):
+class OsAndXs(pygame.sprite.DirtySprite):
     """
     Utilizada para objetos de X ou O no jogo.
 
@@ -361,7 +503,10 @@ class Player(OsAndXs):
         super().__init__(isX, xy)
 
     def update(self):
-        self.rect.center = pygame.mouse.get_pos()
+        mouse_pos = pygame.mouse.get_pos()
+        if mouse_pos != self.rect.center:
+            self.rect.center = mouse_pos
+            self.dirty = 1
 
 
 class Menace(OsAndXs):
@@ -370,86 +515,164 @@ class Menace(OsAndXs):
 
     """
 
-    def __init__(self, isX, xy=None, verbose=False):
+    def __init__(self, isX, xy=None, verbose=False, registro=None):
         super().__init__(isX, xy)
         self.verbose = verbose
         self.menace = Jogador(isX + 1)
+        self.registro = registro
+        self.diario = None
+        self.instrumentacao = None
+        self.partida = []
+
+    def acompanhar_partida(self, estado_jogo):
+        """
+        Atualiza a lista de casas jogadas na partida atual com a jogada do jogador.
+
+        Args:
+            estado_jogo (str): configuração atual do tabuleiro em forma de string
+        """
+        # tabuleiro foi reiniciado (fim de jogo ou tecla R)
+        if any(estado_jogo[casa] == "0" for casa in self.partida):
+            self.partida = []
+        for casa, valor in enumerate(estado_jogo):
+            if valor != "0" and casa not in self.partida:
+                self.partida.append(casa)
+
+    def registrar_partida(self, estado_jogo, resultado):
+        """
+        Grava a partida que acabou de terminar (e já foi reforçada) no registro
+        de partidas e no diário do cérebro, se houver.
+
+        Args:
+            estado_jogo (str): configuração final do tabuleiro em forma de string
+            resultado (int): resultado da partida (api.EMPATE, 1 ou 2)
+        """
+        self.acompanhar_partida(estado_jogo)
+        if self.partida:
+            quem_comecou = int(estado_jogo[self.partida[0]])
+            if self.registro is not None:
+                self.registro.registra(self.partida, resultado, quem_comecou)
+            if self.diario is not None:
+                self.diario.registra(self.partida, resultado, quem_comecou)
+        self.partida = []
 
     def jogada(
-        self, grupo_caixas, lista_de_listas, anim_grupo, pausado, grupo_probs
+        self, grupo_caixas, historico, anim_grupo, pausado, grupo_probs
     ):
         # Jogada:
         estado_jogo = get_string(grupo_caixas)
-        config = Configuracao(estado_jogo)
-        if (
-            (not config.check_vitoria(1))
-            and (not config.check_vitoria(2))
-            and (config.get_symmetry_id().count("0") > 0)
-        ):
-            config, prob = self.menace.realizar_jogada(
-                estado_jogo, self.verbose, True
-            )
+        self.acompanhar_partida(estado_jogo)
+        estado = EstadoJogo(estado_jogo)
+        if not estado.terminou():
+            with self.etapa("jogada: escolha"):
+                estado, prob = self.menace.realizar_jogada(
+                    estado, self.verbose, True
+                )
             prob = prob.ravel()
-            temp = estado_jogo
-            atualizar_tela(
-                grupo_caixas, estado_jogo, config, prob, grupo_probs
-            )
-            self.casa_mudada = list(
-                i != j for i, j in zip(get_string(grupo_caixas), temp)
-            )
-            self.casa_mudada = self.casa_mudada.index(True) + 1
+            with self.etapa("jogada: atualizar_tela"):
+                atualizar_tela(
+                    grupo_caixas, estado_jogo, estado, prob, grupo_probs
+                )
+            self.casa_mudada = estado.casas[-1] + 1
+            self.partida.append(estado.casas[-1])
         # Check vitória, empate, etc.:
-        if config.check_vitoria(self.isX + 1):
-            vitoria(self.menace, lista_de_listas, anim_grupo, pausado)
-        elif config.check_vitoria((not self.isX) + 1):
-            vitoria("p", lista_de_listas, anim_grupo, pausado, self.menace)
-        elif config.get_symmetry_id().count("0") == 0:
-            empate(lista_de_listas, anim_grupo, pausado)
-        else:
+        with self.etapa("jogada: fim de partida"):
+            if estado.resultado == self.isX + 1:
+                vitoria(self.menace, historico, anim_grupo, pausado)
+            elif estado.resultado == (not self.isX) + 1:
+                vitoria("p", historico, anim_grupo, pausado, self.menace)
+            elif estado.resultado == EMPATE:
+                empate(historico, anim_grupo, pausado, self.menace)
+            if estado.terminou():
+                self.registrar_partida(estado.get_string(), estado.resultado)
+        if not estado.terminou():
             # Animação:
             num = self.casa_mudada
-            cena_embaralhando = CenaAnimada(
-                (2 / 5 * DISPLAY_W - 50, DISPLAY_H / 2 + 50),
-                (100, 100),
-                "spr_embaralhando.png",
-            )
-            cena_embaralhando.sprites.extend(
-                get_sprites(
-                    (100, 100), f"files/assets/sprites/spr_opening_{num}.png"
+            with self.etapa("jogada: animação"):
+                cena_embaralhando = CenaAnimada(
+                    (2 / 5 * DISPLAY_W - 50, DISPLAY_H / 2 + 50),
+                    (100, 100),
+                    "spr_embaralhando.png",
                 )
-            )
-            cena_embaralhando.sprites.extend(
-                [cena_embaralhando.sprites[-1]] * 5
-            )
+                cena_embaralhando.adiciona_abertura(num)
             anim_grupo.add(cena_embaralhando)
             cena_embaralhando.animando = len(cena_embaralhando.sprites)
             return True
 
-    def save_pickles(self, lista_de_listas):
-        with open(brain_save_path, "wb") as handle:
-            pickle.dump(
-                self.menace.brain, handle, protocol=pickle.HIGHEST_PROTOCOL
-            )
-
-        with open(history_save_path, "wb") as handle:
-            pickle.dump(
-                lista_de_listas, handle, protocol=pickle.HIGHEST_PROTOCOL
+    def etapa(self, nome):
+        """
+        Mede um trecho da jogada, se houver instrumentação (veja Instrumentacao).
+
+        Args:
+            nome (str): nome do trecho
+        """
+        if self.instrumentacao is None:
+            return contextlib.nullcontext()
+        return self.instrumentacao.etapa(nome)
+
+    def abrir_diario(self, historico, recuperar=True, caminho=None):
+        """
+        Passa a proteger o cérebro do MENACE com um diário e checkpoints em
+        brain_save_path, gravados em segundo plano (veja api.DiarioCerebro).
+
+        Args:
+            historico (api.Historico): histórico de vitórias do jogador, vitórias do
+        MENACE e empates, salvo junto nos checkpoints
+            recuperar (bool): se True, carrega o último checkpoint e refaz as
+        partidas do diário (recuperando o cérebro depois de uma queda)
+            caminho (str, optional): arquivo do checkpoint; por padrão,
+        brain_save_path
+        """
+        self.diario = DiarioCerebro(
+            caminho or brain_save_path,
+            self.menace,
+            historico,
+            recuperar=recuperar,
+        )
+        if self.diario.num_recuperados:
+            print(
+                f"{self.diario.num_recuperados} partidas recuperadas do diário"
             )
 
-    def load_pickles(self, lista_de_listas):
-        with open(brain_save_path, "rb") as handle:
-            loaded_brain = pickle.load(handle)
-            self.menace.brain = loaded_brain
-
-        with open(history_save_path, "rb") as handle:
-            loaded_history = pickle.load(handle)
-            lista_de_listas.clear()
-            lista_de_listas.extend(loaded_history)
+    def fechar_diario(self):
+        """
+        Grava um último checkpoint e fecha o diário do cérebro, se houver.
+        """
+        if self.diario is not None:
+            self.diario.fechar()
+            self.diario = None
+
+    def salvar_cerebro(self, historico):
+        """
+        Salva o cérebro do MENACE e o histórico em brain_save_path (veja
+        api.salva_cerebro).
+
+        Args:
+            historico (api.Historico): histórico de vitórias do jogador, vitórias do
+        MENACE e empates
+        """
+        salva_cerebro(brain_save_path, self.menace, historico)
+
+    def carregar_cerebro(self, historico):
+        """
+        Carrega o cérebro do MENACE e o histórico salvos em brain_save_path. Para
+        usar os cérebros antigos em .pickle, converta-os com files/converte_pickles.py.
+
+        Args:
+            historico (api.Historico): histórico que terá seu conteúdo substituído
+        pelo histórico salvo
+        """
+        _, historico_salvo = carrega_cerebro(brain_save_path, self.menace)
+        historico.substitui(
+            historico_salvo.converte(historico.codigos, self.menace.player_num)
+        )
 
 
-class CenaAnimada(pygame.sprite.Sprite):
+class CenaAnimada(pygame.sprite.DirtySprite):
     """
-    Classe especial para cenas animadas utilizadas durante o jogo.
+    Classe especial para cenas animadas utilizadas durante o jogo. Os quadros em
+    self.sprites já estão aumentados; os de uma abertura (adiciona_abertura) são
+    None até a thread que os aumenta terminar.
 
     """
 
@@ -461,6 +684,36 @@ class CenaAnimada(pygame.sprite.Sprite):
         self.rect.center = xy
         self.count = 0
         self.animando = 0
+        self.abertura = None
+
+    def adiciona_abertura(self, num, repeticoes=5):
+        """
+        Junta ao fim da animação a abertura da caixa num, que é aumentada em
+        segundo plano enquanto os quadros anteriores aparecem.
+
+        Args:
+            num (int): número da caixa (1 a 9)
+            repeticoes (int): vezes que o último quadro é repetido no fim
+        """
+        self.abertura = (len(self.sprites), aumenta_abertura(num))
+        num_quadros = len(
+            recorta_sprites(
+                (100, 100), f"files/assets/sprites/spr_opening_{num}.png"
+            )
+        )
+        self.sprites.extend([None] * (num_quadros + repeticoes))
+
+    def quadro(self, indice):
+        """
+        Quadro aumentado indice; se for da abertura e ela ainda não estiver
+        pronta, espera a thread terminar.
+        """
+        if self.sprites[indice] is None:
+            inicio, futuro = self.abertura
+            quadros = futuro.result()
+            fim = len(self.sprites) - inicio - len(quadros)
+            self.sprites[inicio:] = quadros + quadros[-1:] * fim
+        return self.sprites[indice]
 
     def update(self):
         if (len(self.sprites) == 56) and (round(self.animando, 1) == 11.0):
@@ -473,13 +726,16 @@ class CenaAnimada(pygame.sprite.Sprite):
             self.kill()
         if self.count >= len(self.sprites):
             self.count = 0
-        self.image = self.sprites[int(self.count)]
+        imagem = self.quadro(int(self.count))
+        if imagem != self.image:
+            self.image = imagem
+            self.dirty = 1
 
 
-class Probabilidades(pygame.sprite.Sprite):
+class Probabilidades(pygame.sprite.DirtySprite):
     """
     Utilizada para plotar as probabilidades de cada jogada possível em determinada
-    configuração do tabuleiro.
+    configuração do tabuleiro. A imagem do sprite junta a miçanga e o texto.
 
     """
 
@@ -488,12 +744,419 @@ class Probabilidades(pygame.sprite.Sprite):
         self.font = font
         self.display = display
         self.num = num
+        self.bead = get_bead(num)
+        self.bead_rect = self.bead.get_rect()
+        self.bead_rect.center = (4 / 5 * DISPLAY_W - 70, DISPLAY_H / 10 * num)
+        self.change_text(text)
+
+    def change_text(self, text):
+        """
+        Troca o texto da probabilidade, refazendo a imagem do sprite.
+
+        Args:
+            text (str): texto a ser mostrado ao lado da miçanga
+        """
         self.text = self.font.render(text, True, (255, 255, 255))
         self.prob_rect = self.text.get_rect()
-        self.prob_rect.center = (4 / 5 * DISPLAY_W, DISPLAY_H / 10 * num)
-        self.image = get_bead(num)
-        self.rect = self.image.get_rect()
-        self.rect.center = (4 / 5 * DISPLAY_W - 70, DISPLAY_H / 10 * num)
+        self.prob_rect.center = (4 / 5 * DISPLAY_W, DISPLAY_H / 10 * self.num)
+        self.rect = self.bead_rect.union(self.prob_rect)
+        self.image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.image.blit(
+            self.bead, self.bead_rect.move(-self.rect.x, -self.rect.y)
+        )
+        self.image.blit(
+            self.text, self.prob_rect.move(-self.rect.x, -self.rect.y)
+        )
+        self.dirty = 1
 
-    def update(self):
-        self.display.blit(self.text, self.prob_rect)
+
+class RitmoAdaptativo:
+    """
+    Controla a taxa de quadros do loop do jogo. Enquanto algo se mexe na tela o
+    loop roda a fps quadros por segundo; quando a cena está parada, o loop dorme
+    esperando o próximo evento (mouse, teclado), sem gastar processador.
+
+    """
+
+    def __init__(self, fps, espera_maxima=1000):
+        """
+        Args:
+            fps (int): taxa de quadros enquanto há animação
+            espera_maxima (int): tempo máximo (ms) dormindo sem nenhum evento
+        """
+        self.fps = fps
+        self.espera_maxima = espera_maxima
+        self.clock = pygame.time.Clock()
+        self.ocioso = False
+        self.reinicia_medida()
+
+    def reinicia_medida(self):
+        """
+        Zera a contagem usada por fps_efetivo.
+        """
+        self.quadros = 0
+        self.tempo_ocioso = 0
+        self.inicio = pygame.time.get_ticks()
+
+    def eventos(self):
+        """
+        Devolve os eventos do quadro atual. Se a cena estava parada no fim do
+        último quadro, primeiro espera chegar um evento.
+
+        Returns:
+            events (list): lista de eventos do pygame
+        """
+        events = []
+        if self.ocioso:
+            antes = pygame.time.get_ticks()
+            evento = pygame.event.wait(self.espera_maxima)
+            self.tempo_ocioso += pygame.time.get_ticks() - antes
+            if evento.type != pygame.NOEVENT:
+                events.append(evento)
+        return events + pygame.event.get()
+
+    def tick(self, ocioso):
+        """
+        Fecha o quadro atual.
+
+        Args:
+            ocioso (bool): True se a cena está parada (nada muda até o próximo
+        evento); nesse caso o próximo quadro espera por um evento
+        """
+        self.quadros += 1
+        self.ocioso = ocioso
+        self.clock.tick(self.fps)
+
+    def fps_efetivo(self):
+        """
+        Calcula a taxa de quadros desde a última medida e começa uma nova.
+
+        Returns:
+            fps (float): quadros desenhados por segundo
+            ocioso (float): fração do tempo dormindo à espera de eventos
+        """
+        tempo = max(pygame.time.get_ticks() - self.inicio, 1)
+        fps, ocioso = 1000 * self.quadros / tempo, self.tempo_ocioso / tempo
+        self.reinicia_medida()
+        return fps, ocioso
+
+
+class Robo:
+    """
+    Jogador automático para o modo headless (python main.py --headless JOGOS). A
+    cada quadro gera os eventos que uma pessoa geraria: clica numa caixinha vazia
+    quando é a vez do jogador, aperta Enter na tela de "próximo" (e, como uma
+    pessoa impaciente, para pular as animações) e, depois de num_jogos partidas,
+    digita o Konami code para fechar o jogo. Também mede a
+    duração de cada quadro, a memória e as partidas por segundo.
+
+    """
+
+    def __init__(
+        self, num_jogos, historico, semente=None, pular_animacoes=True
+    ):
+        """
+        Args:
+            num_jogos (int): número de partidas a jogar
+            historico (api.Historico): histórico do jogo, usado para contar as
+        partidas terminadas
+            semente (int, optional): semente do sorteio das jogadas do robô e do
+        MENACE
+            pular_animacoes (bool): se True, aperta Enter assim que uma animação
+        começa; se False, espera cada animação terminar, como no ritmo normal
+        do jogo
+        """
+        self.num_jogos = num_jogos
+        self.historico = historico
+        self.pular_animacoes = pular_animacoes
+        self.rng = rnd.Random(semente)
+        if semente is not None:
+            rnd.seed(semente)
+        self.duracoes = []
+        self.memoria = [memoria_maxima()]
+        self.inicio = self.ultimo = time.perf_counter()
+
+    def eventos(self, grupo_caixas, anim_grupo, pausado):
+        """
+        Devolve os eventos do quadro atual: os da fila do pygame mais os do robô.
+
+        Args:
+            grupo_caixas (pygame.sprite.Group): grupo de caixas do tabuleiro
+            anim_grupo (pygame.sprite.Group): grupo de cenas animadas
+            pausado (list): lista com os valores booleanos de pausa
+
+        Returns:
+            events (list): lista de eventos do pygame
+        """
+        agora = time.perf_counter()
+        self.duracoes.append(agora - self.ultimo)
+        self.ultimo = agora
+
+        events = pygame.event.get()
+        if len(anim_grupo) != 0 or pausado[1]:
+            if self.pular_animacoes:
+                tecla = pygame.K_RETURN
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=tecla))
+            return events
+
+        if self.historico.num_jogos >= self.num_jogos:
+            teclas = [pygame.K_UP, pygame.K_UP, pygame.K_DOWN, pygame.K_DOWN]
+            teclas += [pygame.K_LEFT, pygame.K_RIGHT] * 2 + [pygame.K_b]
+            teclas += [pygame.K_a]
+            tipo = pygame.KEYDOWN
+            events += [pygame.event.Event(tipo, key=t) for t in teclas]
+        elif pausado[0]:
+            if len(self.memoria) <= self.historico.num_jogos:
+                self.memoria.append(memoria_maxima())
+            tecla = pygame.K_RETURN
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=tecla))
+        else:
+            vazias = [caixa for caixa in grupo_caixas if caixa.value == 0]
+            if vazias:
+                caixa = self.rng.choice(vazias)
+                events.append(
+                    pygame.event.Event(
+                        pygame.MOUSEBUTTONDOWN, pos=caixa.rect.center, button=1
+                    )
+                )
+        return events
+
+    def relatorio(self):
+        """
+        Resume a sessão: partidas por segundo, tempos de quadro e memória.
+
+        Returns:
+            texto (str): relatório pronto para ser impresso
+        """
+        tempo = time.perf_counter() - self.inicio
+        duracoes = np.array(self.duracoes[1:]) * 1000
+        p50, p99 = (
+            np.percentile(duracoes, [50, 99]) if len(duracoes) else (0, 0)
+        )
+        jogos = self.historico.num_jogos
+        linhas = [
+            f"Partidas: {jogos} em {tempo:.1f} s ({jogos / tempo:.1f} por segundo)",
+            f"Quadros: {len(duracoes)} ({len(duracoes) / tempo:.0f} por segundo)",
+            f"Tempo de quadro (ms): p50 {p50:.2f}, p99 {p99:.2f}, "
+            f"máximo {duracoes.max(initial=0):.2f}",
+        ]
+        if self.memoria[0] is not None:
+            inicial, final = self.memoria[0], self.memoria[-1]
+            linhas.append(
+                f"Memória máxima (MB): {inicial:.1f} no início, {final:.1f} "
+                f"no fim ({final - inicial:+.1f})"
+            )
+        return "\n".join(linhas)
+
+
+class Instrumentacao(pygame.sprite.DirtySprite):
+    """
+    Mede o tempo gasto em cada etapa do loop do jogo e da jogada do MENACE, o
+    tempo de cada quadro e o tempo dos quadros que trataram um clique (do
+    início do quadro até a tela atualizada; o pygame não informa quando o
+    clique chegou na fila, então a espera antes do quadro não entra). Os
+    tempos ficam em histogramas de tamanho fixo. Também é o sprite do painel
+    com essas medidas (tecla I). Enquanto não for ativada, as medidas não
+    custam nada além de um if.
+
+    """
+
+    LIMITE_HISTOGRAMA = 100  # ms; quadros mais lentos caem no último intervalo
+
+    def __init__(self, font, ativa=False, janela=120):
+        """
+        Args:
+            font (pygame.font.Font): fonte do painel
+            ativa (bool): se True, já começa medindo (sem mostrar o painel)
+            janela (int): número de quadros recentes mostrados no painel
+        """
+        super().__init__()
+        self.font = font
+        self.ativa = ativa
+        self.janela = janela
+        self.visible = False
+        self.image = pygame.Surface((1, 1), pygame.SRCALPHA)
+        self.rect = self.image.get_rect()
+        self.histograma = np.zeros(2 * self.LIMITE_HISTOGRAMA + 1, np.int64)
+        self.histograma_cliques = np.zeros_like(self.histograma)
+        self.etapas = {}  # nome -> [tempo total, vezes]
+        self.recentes = {}  # nome -> tempos dos últimos quadros
+        self.quadros_recentes = deque(maxlen=janela)
+        self._quadro = {}
+        self._inicio = self._marca = None
+        self._clique = False
+
+    def alterna(self):
+        """
+        Mostra ou esconde o painel; a primeira vez também liga as medidas.
+        """
+        self.ativa = True
+        self.visible = not self.visible
+
+    def inicio_quadro(self, events):
+        """
+        Começa a medir um quadro, logo depois de receber os eventos dele.
+
+        Args:
+            events (list): eventos do quadro; com um clique, o quadro também
+        entra no histograma de quadros com clique
+        """
+        if not self.ativa:
+            return
+        self._inicio = self._marca = time.perf_counter()
+        self._clique = any(e.type == pygame.MOUSEBUTTONDOWN for e in events)
+        self._quadro = {}
+
+    def marca(self, nome):
+        """
+        Atribui à etapa nome o tempo desde a marca anterior do quadro.
+
+        Args:
+            nome (str): nome da etapa do loop que acabou de terminar
+        """
+        if self._marca is None:
+            return
+        agora = time.perf_counter()
+        self._soma(nome, agora - self._marca)
+        self._marca = agora
+
+    def etapa(self, nome):
+        """
+        Mede o bloco with dentro de uma etapa do loop (por exemplo, as partes de
+        Menace.jogada), sem mexer nas marcas.
+
+        Args:
+            nome (str): nome da etapa
+
+        Returns:
+            gerenciador de contexto que mede o bloco
+        """
+        if self._marca is None:
+            return contextlib.nullcontext()
+        return self._mede(nome)
+
+    @contextlib.contextmanager
+    def _mede(self, nome):
+        inicio = time.perf_counter()
+        yield
+        self._soma(nome, time.perf_counter() - inicio)
+
+    def _soma(self, nome, tempo):
+        self._quadro[nome] = self._quadro.get(nome, 0) + tempo
+
+    def fim_quadro(self):
+        """
+        Termina o quadro (depois de pygame.display.update) e guarda as medidas.
+        Com o painel visível, já prepara a imagem dele para o próximo quadro.
+        """
+        if self._marca is None:
+            return
+        duracao = (time.perf_counter() - self._inicio) * 1000
+        self._marca = None
+        intervalo = min(int(duracao * 2), len(self.histograma) - 1)
+        self.histograma[intervalo] += 1
+        if self._clique:
+            self.histograma_cliques[intervalo] += 1
+        self.quadros_recentes.append(duracao)
+        for nome in set(self.etapas) | set(self._quadro):
+            tempo = self._quadro.get(nome, 0) * 1000
+            total = self.etapas.setdefault(nome, [0, 0])
+            total[0] += tempo
+            total[1] += nome in self._quadro
+            recentes = self.recentes.setdefault(
+                nome, deque(maxlen=self.janela)
+            )
+            recentes.append(tempo)
+        if self.visible:
+            self.desenha_painel()
+
+    def percentis(self, histograma=None):
+        """
+        Calcula p50 e p99 em ms de um histograma de tempos de quadro.
+
+        Args:
+            histograma (np.ndarray, optional): se None, usa o histograma de
+        todos os quadros medidos
+
+        Returns:
+            p50, p99 (float): percentis 50 e 99 (limite superior do intervalo
+        de 0,5 ms)
+        """
+        if histograma is None:
+            histograma = self.histograma
+        acumulado = np.cumsum(histograma)
+        if acumulado[-1] == 0:
+            return 0.0, 0.0
+        limites = [0.5 * acumulado[-1], 0.99 * acumulado[-1]]
+        intervalos = np.searchsorted(acumulado, limites)
+        return tuple(float(i + 1) / 2 for i in intervalos)
+
+    def desenha_painel(self):
+        """
+        Refaz a imagem do painel: tempo médio de cada etapa nos últimos quadros,
+        percentis de quadro (todos e com clique) e um histograma dos últimos
+        quadros.
+        """
+        linhas = [
+            "quadro p50 %.1f p99 %.1f ms" % self.percentis(),
+            "quadro c/ clique p50 %.1f p99 %.1f ms"
+            % self.percentis(self.histograma_cliques),
+        ]
+        for nome, tempos in self.recentes.items():
+            linhas.append(f"{nome}: {np.mean(tempos):.2f} ms")
+        textos = [self.font.render(l, True, (255, 255, 255)) for l in linhas]
+        altura_texto = sum(t.get_height() for t in textos)
+        largura = max([2 * self.janela] + [t.get_width() for t in textos])
+        altura_grafico = 80
+
+        self.image = pygame.Surface(
+            (largura + 20, altura_texto + altura_grafico + 30), pygame.SRCALPHA
+        )
+        self.image.fill((0, 0, 0, 180))
+        y = 10
+        for texto in textos:
+            self.image.blit(texto, (10, y))
+            y += texto.get_height()
+        # barras dos últimos quadros; a linha marca 1/60 s
+        base = y + 10 + altura_grafico
+        for i, duracao in enumerate(self.quadros_recentes):
+            altura = min(duracao / 50, 1) * altura_grafico
+            cor = (255, 80, 80) if duracao > 1000 / 60 else (80, 255, 80)
+            pygame.draw.rect(
+                self.image, cor, (10 + 2 * i, base - altura, 2, altura)
+            )
+        limite = base - (1000 / 60) / 50 * altura_grafico
+        pygame.draw.line(
+            self.image, (255, 255, 255), (10, limite), (largura + 10, limite)
+        )
+        self.rect = self.image.get_rect(topleft=(10, 10))
+        self.dirty = 1
+
+    def exporta(self, caminho):
+        """
+        Grava as medidas da sessão em JSON: percentis de quadro (todos e com
+        clique), tempo médio de cada etapa (nos quadros em que ela aconteceu) e
+        os histogramas de tempos de quadro.
+
+        Args:
+            caminho (str): arquivo de saída
+        """
+        quadro = self.percentis()
+        clique = self.percentis(self.histograma_cliques)
+        dados = {
+            "quadros": int(self.histograma.sum()),
+            "quadro_p50_ms": quadro[0],
+            "quadro_p99_ms": quadro[1],
+            "quadros_com_clique": int(self.histograma_cliques.sum()),
+            "quadro_com_clique_p50_ms": clique[0],
+            "quadro_com_clique_p99_ms": clique[1],
+            "etapas_ms": {
+                nome: total / max(vezes, 1)
+                for nome, (total, vezes) in self.etapas.items()
+            },
+            "histograma_intervalo_ms": 0.5,
+            "histograma": self.histograma.tolist(),
+            "histograma_com_clique": self.histograma_cliques.tolist(),
+        }
+        with open(caminho, "w") as handle:
+            json.dump(dados, handle, indent=2)
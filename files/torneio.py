@@ -0,0 +1,319 @@
+"""
+Torneio entre cérebros salvos.
+
+Cada par de participantes joga o mesmo número de partidas nas duas ordens
+(cada um começa metade das vezes), com os cérebros congelados: as missangas
+não mudam durante o torneio. As partidas de cada par são divididas em
+tarefas espalhadas por todos os núcleos com um `ProcessPoolExecutor`, e cada
+tarefa joga em lote com a `simulacao_em_lote`.
+
+Um cérebro salvo só foi treinado com uma das peças; com a outra, quase todas
+as caixas têm só as missangas iniciais. Por isso os resultados e as notas no
+estilo Elo são dados por peça: cada participante tem uma nota jogando com a
+peça 1 (começando) e outra com a peça 2, e uma nota da peça em que ele não
+foi treinado não contamina a outra. Na tabela impressa, essas notas são
+marcadas com *.
+
+Para rodar a partir da pasta do repositório:
+
+    python -m files.torneio files/assets/dados/brain_*.npz perfeito novato
+
+Além de arquivos salvos com `salva_cerebro`, os participantes podem ser
+"perfeito" (joga pelo minimax, veja `JogadorPerfeito`) ou "novato" (caixas
+com as missangas iniciais, sem treino nenhum).
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+
+from files.api import (
+    Jogador,
+    JogadorPerfeito,
+    carrega_cerebro,
+    simulacao_em_lote,
+)
+
+ESPECIAIS = ["perfeito", "novato"]
+
+
+def nome_participante(participante):
+    """Nome curto de um participante (o nome do arquivo, sem extensão)."""
+    if participante in ESPECIAIS:
+        return participante
+    return os.path.splitext(os.path.basename(participante))[0]
+
+
+@lru_cache(maxsize=None)
+def peca_treinada(participante):
+    """Peça (1 ou 2) com que o participante foi treinado, ou `None` para
+    "perfeito" e "novato", que jogam igual com as duas."""
+    if participante in ESPECIAIS:
+        return None
+    jogador, _ = carrega_cerebro(participante)
+    return jogador.player_num
+
+
+@lru_cache(maxsize=None)
+def cerebro_congelado(participante, player_num):
+    """Cérebro completo de um participante jogando com a peça `player_num`.
+
+    O "perfeito" usa o cérebro congelado do `JogadorPerfeito`. Um cérebro
+    salvo só tem as caixas da peça com que foi treinado (e às vezes nem
+    todas), então é completado pelo `Jogador.de_denso` de um jogador com a
+    peça `player_num`: as caixas que faltam ficam com as missangas iniciais.
+    Caixas sem nenhuma missanga são reiniciadas, como no jogo.
+
+    Args:
+        participante (str): arquivo salvo por `salva_cerebro`, "perfeito" ou
+    "novato"
+        player_num (int): peça (1 ou 2) com que o participante joga
+
+    Returns:
+        cerebro (CerebroDenso): cérebro que não deve ser alterado (é
+    compartilhado entre as tarefas do mesmo processo)
+    """
+    if participante == "perfeito":
+        return JogadorPerfeito(player_num).brain
+
+    if participante == "novato":
+        return Jogador(player_num, cerebro="denso").brain
+
+    salvo, _ = carrega_cerebro(participante, cerebro="denso")
+    jogador = Jogador(
+        player_num,
+        salvo.valor_inicial,
+        decay_do_valor_inicial=salvo.decay_do_valor_inicial,
+        cerebro="denso",
+    )
+    jogador.de_denso(salvo.brain)
+    cerebro = jogador.brain
+
+    vazias = cerebro.contagens.sum(axis=1) <= 0
+    cerebro.contagens[vazias] = np.where(
+        cerebro.validas[vazias], jogador.valor_inicial, 0
+    )
+    cerebro.sincroniza()
+    return cerebro
+
+
+def joga_confronto(participante1, participante2, num_jogos, semente):
+    """Joga `num_jogos` partidas. É a função executada em cada processo.
+
+    Args:
+        participante1 (str): participante que começa (peça 1)
+        participante2 (str): participante com a peça 2
+        num_jogos (int): número de partidas
+        semente (np.random.SeedSequence): semente da `simulacao_em_lote`
+
+    Returns:
+        contagem (tuple): vitórias do 1, vitórias do 2 e empates
+    """
+    jogadores = []
+    for player_num, participante in enumerate(
+        [participante1, participante2], start=1
+    ):
+        jogador = Jogador(player_num, cerebro="denso")
+        jogador.brain = cerebro_congelado(participante, player_num)
+        jogadores.append(jogador)
+
+    _, _, vitorias1, vitorias2, empates = simulacao_em_lote(
+        *jogadores,
+        num_jogos,
+        tamanho_lote=min(num_jogos, 10000),
+        semente=semente,
+        reforcar=False,
+    )
+    return int(vitorias1[-1]), int(vitorias2[-1]), int(empates[-1])
+
+
+def notas_elo(pontos, jogos, media=1500, iteracoes=1000):
+    """Notas no estilo Elo que melhor explicam os resultados.
+
+    Ajusta um modelo de Bradley-Terry (empate vale meio ponto) pelo algoritmo
+    de Hunter. Cada par recebe também um empate fictício, para que quem
+    nunca ganhou (ou nunca perdeu) não vá para nota infinita.
+
+    Args:
+        pontos (np.ndarray): matriz com os pontos de i contra j
+        jogos (np.ndarray): matriz com o número de partidas entre i e j
+        media (float): média das notas
+        iteracoes (int): número máximo de iterações
+
+    Returns:
+        notas (np.ndarray): nota de cada participante; 400 pontos de diferença
+    são chances de 10 para 1
+    """
+    outros = ~np.eye(len(pontos), dtype=bool)
+    pontos = pontos + 0.5 * outros
+    jogos = jogos + outros
+    forca = np.ones(len(pontos))
+    for _ in range(iteracoes):
+        nova = pontos.sum(axis=1) / (
+            jogos / (forca[:, None] + forca[None, :])
+        ).sum(axis=1)
+        nova /= np.exp(np.log(nova).mean())
+        if np.allclose(nova, forca, rtol=1e-10, atol=0):
+            break
+        forca = nova
+    notas = 400 * np.log10(forca)
+    return notas - notas.mean() + media
+
+
+def torneio(
+    participantes,
+    num_jogos=10000,
+    jogos_por_tarefa=50000,
+    semente=0,
+    max_workers=None,
+    verbose=True,
+):
+    """Joga todos os pares de participantes, nas duas ordens.
+
+    Args:
+        participantes (list): arquivos salvos com `salva_cerebro`, "perfeito"
+    ou "novato"
+        num_jogos (int): partidas de cada par em cada ordem
+        jogos_por_tarefa (int): máximo de partidas em cada tarefa
+        semente (int): semente de todas as partidas
+        max_workers (int): número de processos
+        verbose (bool): se `True`, printa o progresso
+
+    Returns:
+        saida (dict): nomes, `pecas_treinadas`, matrizes `vitorias`, `empates`
+    e `derrotas` (linha i com a peça 1 contra coluna j com a peça 2),
+    `confrontos` com as mesmas contagens por nome e as `notas` Elo de cada
+    participante com cada peça
+    """
+    nomes = [nome_participante(p) for p in participantes]
+    n = len(participantes)
+
+    tarefas = []
+    for i in range(n):
+        for j in range(n):
+            if i == j:
+                continue
+            for inicio in range(0, num_jogos, jogos_por_tarefa):
+                jogos = min(jogos_por_tarefa, num_jogos - inicio)
+                tarefas.append((i, j, jogos))
+    sementes = np.random.SeedSequence(semente).spawn(len(tarefas))
+
+    # resultado[i, j] = (vitórias de i, vitórias de j, empates) com i começando
+    resultado = np.zeros((n, n, 3), dtype=np.int64)
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers or os.cpu_count()) as pool:
+        futuros = {
+            pool.submit(
+                joga_confronto, participantes[i], participantes[j], jogos, s
+            ): (i, j)
+            for (i, j, jogos), s in zip(tarefas, sementes)
+        }
+        for feitos, futuro in enumerate(as_completed(futuros), start=1):
+            i, j = futuros[futuro]
+            resultado[i, j] += futuro.result()
+            if verbose:
+                print(
+                    f"[{feitos}/{len(tarefas)}] {nomes[i]} x {nomes[j]}",
+                    end="\r",
+                )
+
+    vitorias, derrotas, empates = np.moveaxis(resultado, 2, 0)
+    pecas = [peca_treinada(p) for p in participantes]
+
+    # cada participante entra duas vezes no ajuste das notas: com a peça 1
+    # (índices 0 a n - 1) e com a peça 2 (índices n a 2n - 1)
+    pontos = np.zeros((2 * n, 2 * n))
+    jogos = np.zeros((2 * n, 2 * n))
+    pontos[:n, n:] = vitorias + empates / 2
+    pontos[n:, :n] = (derrotas + empates / 2).T
+    jogos[:n, n:] = vitorias + derrotas + empates
+    jogos[n:, :n] = jogos[:n, n:].T
+    notas = notas_elo(pontos, jogos).reshape(2, n).T
+    tempo = time.perf_counter() - inicio
+
+    if verbose:
+        total = int(resultado.sum())
+        print(f"\n{total} partidas em {tempo:.1f} s ({total / tempo:.0f}/s)")
+        imprime_tabela(nomes, pecas, vitorias, empates, derrotas, notas)
+
+    return {
+        "nomes": nomes,
+        "participantes": list(participantes),
+        "num_jogos": num_jogos,
+        "semente": semente,
+        "tempo": tempo,
+        "pecas_treinadas": dict(zip(nomes, pecas)),
+        "vitorias": vitorias.tolist(),
+        "empates": empates.tolist(),
+        "derrotas": derrotas.tolist(),
+        "confrontos": {
+            f"{nomes[i]} x {nomes[j]}": dict(
+                zip(
+                    ["vitorias1", "vitorias2", "empates"],
+                    resultado[i, j].tolist(),
+                )
+            )
+            for i in range(n)
+            for j in range(n)
+            if i != j
+        },
+        "notas": {
+            nome: dict(zip(["1", "2"], nota))
+            for nome, nota in zip(nomes, notas.round(1).tolist())
+        },
+    }
+
+
+def imprime_tabela(nomes, pecas, vitorias, empates, derrotas, notas):
+    """Printa as notas com cada peça e a matriz de vitórias/empates/derrotas
+    (em %) de cada linha com a peça 1 contra cada coluna com a peça 2. Notas
+    de uma peça com que o participante não foi treinado levam um *."""
+    largura = max(len(nome) for nome in nomes) + 2
+    ordem = np.argsort(-notas[:, 0])
+    print(
+        " " * largura
+        + f"{'peça 1':>7} {'peça 2':>7} "
+        + "".join(f"{nomes[j]:>{largura}}" for j in ordem)
+    )
+    for i in ordem:
+        colunas = []
+        for peca in [1, 2]:
+            marca = "*" if pecas[i] not in (None, peca) else " "
+            colunas.append(f"{notas[i, peca - 1]:7.0f}{marca}")
+        for j in ordem:
+            jogos = vitorias[i, j] + empates[i, j] + derrotas[i, j]
+            if i == j or jogos == 0:
+                colunas.append(f"{'-':>{largura}}")
+                continue
+            v, e, d = np.array([vitorias, empates, derrotas])[:, i, j] / jogos
+            celula = f"{100 * v:.0f}/{100 * e:.0f}/{100 * d:.0f}"
+            colunas.append(f"{celula:>{largura}}")
+        print(f"{nomes[i]:>{largura}}" + "".join(colunas))
+    print("* peça diferente da do treino")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("participantes", nargs="+")
+    parser.add_argument("--jogos", type=int, default=10000)
+    parser.add_argument("--tarefa", type=int, default=50000)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--saida", default=None, help="arquivo JSON")
+    args = parser.parse_args()
+
+    saida = torneio(
+        args.participantes,
+        args.jogos,
+        args.tarefa,
+        args.semente,
+        args.processos,
+    )
+    if args.saida:
+        with open(args.saida, "w") as handle:
+            json.dump(saida, handle, indent=2)
@@ -0,0 +1,328 @@
+"""
+Varredura de hiperparâmetros de reforço do `Jogador`.
+
+Roda uma simulação para cada combinação de uma grade de parâmetros e cada
+semente, espalhando as execuções por todos os núcleos com um
+`ProcessPoolExecutor`. Cada execução terminada é gravada na hora em um único
+arquivo SQLite, com as curvas de vitórias/empates e os cérebros finais. Com
+`--convergencia`, cada execução para assim que o aprendizado estabiliza (veja
+`api.Convergencia`), e `num_jogos` guarda quantos jogos ela realmente jogou.
+
+Por padrão cada execução é a `simulacao`, que reforça os cérebros a cada
+jogo, como no jogo de verdade. Com `--lote N`, a `simulacao_em_lote` é bem
+mais rápida, mas só reforça a cada N jogos (e só então reinicia caixas
+vazias): é outra regra de aprendizado, e os resultados não descrevem mais o
+MENACE jogo a jogo. O tamanho do lote de cada execução fica na coluna
+`tamanho_lote` (0 para jogo a jogo).
+
+Para rodar a partir da pasta do repositório:
+
+    python -m files.varredura --grade '{"reforco_vitoria": [1, 3, 5]}'
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+
+import numpy as np
+
+from files.api import (
+    CerebroDenso,
+    Convergencia,
+    Jogador,
+    simulacao,
+    simulacao_em_lote,
+)
+
+PARAMETROS = [
+    "valor_inicial",
+    "reforco_vitoria",
+    "reforco_derrota",
+    "reforco_empate",
+    "decay_do_valor_inicial",
+]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY,
+    parametros TEXT NOT NULL,
+    semente INTEGER NOT NULL,
+    num_jogos INTEGER NOT NULL,
+    vitorias1 INTEGER NOT NULL,
+    vitorias2 INTEGER NOT NULL,
+    empates INTEGER NOT NULL,
+    tempo REAL NOT NULL,
+    curvas BLOB NOT NULL,
+    cerebro1 BLOB NOT NULL,
+    cerebro2 BLOB NOT NULL,
+    tamanho_lote INTEGER
+)
+"""
+
+
+def expande_grade(grade):
+    """Lista todas as combinações de uma grade de parâmetros.
+
+    Args:
+        grade (dict): nome do parâmetro -> lista de valores. Parâmetros sem
+    prefixo valem para os dois jogadores; com prefixo "jogador1_" ou
+    "jogador2_" valem só para aquele jogador.
+
+    Returns:
+        combinacoes (list): lista de dicionários {parâmetro: valor}
+    """
+    nomes = list(grade)
+    return [dict(zip(nomes, valores)) for valores in product(*grade.values())]
+
+
+def parametros_jogador(parametros, player_num):
+    """Separa os argumentos do `Jogador` de número `player_num`."""
+    kwargs = {}
+    for nome, valor in parametros.items():
+        if nome.startswith("jogador"):
+            prefixo, nome = nome.split("_", 1)
+            if prefixo != f"jogador{player_num}":
+                continue
+        assert nome in PARAMETROS, f"Parâmetro desconhecido: {nome}"
+        kwargs[nome] = valor
+    return kwargs
+
+
+def serializa_cerebro(cerebro):
+    """Converte um cérebro em bytes (formato .npz, sem pickle)."""
+    if not isinstance(cerebro, CerebroDenso):
+        cerebro = CerebroDenso.de_dicionario(cerebro)
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        ids=np.array(cerebro.ids),
+        contagens=cerebro.contagens,
+        validas=cerebro.validas,
+    )
+    return buffer.getvalue()
+
+
+def desserializa_cerebro(dados):
+    """Inverso da `serializa_cerebro`."""
+    with np.load(io.BytesIO(dados)) as arquivo:
+        return CerebroDenso(
+            arquivo["ids"], arquivo["contagens"], arquivo["validas"]
+        )
+
+
+def executa(parametros, semente, num_jogos, tamanho_lote, convergencia=None):
+    """Roda uma simulação. É a função executada em cada processo.
+
+    Args:
+        parametros (dict): uma combinação da grade (veja `expande_grade`)
+        semente (int): semente dos geradores aleatórios
+        num_jogos (int): número de jogos da simulação
+        tamanho_lote (int): tamanho do lote da `simulacao_em_lote`; se for
+    `None`, usa a `simulacao` jogo a jogo
+        convergencia (dict): argumentos da `Convergencia`; se for `None`, joga
+    sempre os `num_jogos`
+
+    Returns:
+        linha (dict): valores de uma linha da tabela `execucoes`
+    """
+    random.seed(semente)
+    inicio = time.perf_counter()
+
+    player1 = Jogador(1, cerebro="denso", **parametros_jogador(parametros, 1))
+    player2 = Jogador(2, cerebro="denso", **parametros_jogador(parametros, 2))
+    monitor = None if convergencia is None else Convergencia(**convergencia)
+
+    if tamanho_lote is None:
+        _, _, vitorias1, vitorias2, empates = simulacao(
+            player1, player2, num_jogos, convergencia=monitor
+        )
+    else:
+        _, _, vitorias1, vitorias2, empates = simulacao_em_lote(
+            player1,
+            player2,
+            num_jogos,
+            tamanho_lote,
+            semente,
+            convergencia=monitor,
+        )
+
+    curvas = np.array([vitorias1, vitorias2, empates], dtype=np.int64)
+    buffer = io.BytesIO()
+    np.save(buffer, curvas)
+
+    return {
+        "parametros": json.dumps(parametros, sort_keys=True),
+        "semente": semente,
+        "tamanho_lote": tamanho_lote or 0,
+        "num_jogos": len(vitorias1) - 1,
+        "vitorias1": int(curvas[0, -1]),
+        "vitorias2": int(curvas[1, -1]),
+        "empates": int(curvas[2, -1]),
+        "tempo": time.perf_counter() - inicio,
+        "curvas": buffer.getvalue(),
+        "cerebro1": serializa_cerebro(player1.brain),
+        "cerebro2": serializa_cerebro(player2.brain),
+    }
+
+
+def varredura(
+    grade,
+    num_sementes=3,
+    num_jogos=10000,
+    caminho="varredura.sqlite",
+    tamanho_lote=None,
+    max_workers=None,
+    verbose=True,
+    convergencia=None,
+):
+    """Roda todas as combinações da grade com `num_sementes` réplicas cada.
+
+    As execuções são distribuídas por `max_workers` processos (por padrão,
+    todos os núcleos) e cada uma é gravada em `caminho` assim que termina,
+    então uma varredura interrompida não perde o que já rodou.
+
+    Args:
+        grade (dict): grade de parâmetros (veja `expande_grade`)
+        num_sementes (int): número de réplicas (sementes 0, 1, ...) por
+    combinação
+        num_jogos (int): número de jogos de cada simulação
+        caminho (str): arquivo SQLite onde os resultados são guardados
+        tamanho_lote (int): veja `executa`; por padrão, jogo a jogo
+        max_workers (int): número de processos
+        verbose (bool): se `True`, printa o progresso
+        convergencia (dict): veja `executa`
+
+    Returns:
+        caminho (str): o arquivo SQLite com os resultados
+    """
+    if verbose and tamanho_lote:
+        print(
+            f"Reforço a cada {tamanho_lote} jogos (simulacao_em_lote): não é "
+            "o aprendizado jogo a jogo da simulacao"
+        )
+    tarefas = [
+        (parametros, semente)
+        for parametros in expande_grade(grade)
+        for semente in range(num_sementes)
+    ]
+
+    with sqlite3.connect(caminho) as conexao:
+        conexao.execute(ESQUEMA)
+        colunas = [
+            c[1] for c in conexao.execute("PRAGMA table_info(execucoes)")
+        ]
+        if "tamanho_lote" not in colunas:
+            # arquivos antigos: o lote das execuções já gravadas fica NULL
+            conexao.execute(
+                "ALTER TABLE execucoes ADD COLUMN tamanho_lote INTEGER"
+            )
+
+        with ProcessPoolExecutor(max_workers or os.cpu_count()) as pool:
+            futuros = [
+                pool.submit(
+                    executa, p, s, num_jogos, tamanho_lote, convergencia
+                )
+                for p, s in tarefas
+            ]
+            for feitos, futuro in enumerate(as_completed(futuros), start=1):
+                linha = futuro.result()
+                conexao.execute(
+                    f"INSERT INTO execucoes ({', '.join(linha)}) "
+                    f"VALUES ({', '.join('?' * len(linha))})",
+                    list(linha.values()),
+                )
+                conexao.commit()
+                if verbose:
+                    print(
+                        f"[{feitos}/{len(tarefas)}] {linha['parametros']} "
+                        f"semente={linha['semente']} "
+                        f"({linha['num_jogos']} jogos, {linha['tempo']:.1f} s)"
+                    )
+
+    return caminho
+
+
+def carrega_resultados(caminho, curvas=False, cerebros=False):
+    """Lê a tabela de resultados de uma varredura, pronta para plotar.
+
+    Args:
+        caminho (str): arquivo SQLite gerado pela `varredura`
+        curvas (bool): se `True`, inclui a coluna "curvas" com o array
+    (3, num_jogos + 1) de vitórias 1, vitórias 2 e empates acumulados
+        cerebros (bool): se `True`, inclui as colunas "cerebro1" e "cerebro2"
+    com os cérebros finais (instâncias de `CerebroDenso`)
+
+    Returns:
+        tabela (dict): nome da coluna -> array com um valor por execução. Cada
+    parâmetro da grade vira uma coluna. `tamanho_lote` é 0 para execuções
+    jogo a jogo e `None` para as de arquivos antigos, sem essa coluna.
+    """
+    colunas = ["id", "parametros", "semente", "num_jogos", "vitorias1"]
+    colunas += ["vitorias2", "empates", "tempo", "tamanho_lote"]
+    colunas += ["curvas"] * curvas + ["cerebro1", "cerebro2"] * cerebros
+
+    with sqlite3.connect(caminho) as conexao:
+        linhas = conexao.execute(
+            f"SELECT {', '.join(colunas)} FROM execucoes ORDER BY id"
+        ).fetchall()
+
+    tabela = {}
+    for i, nome in enumerate(colunas):
+        valores = [linha[i] for linha in linhas]
+        if nome == "curvas":
+            tabela[nome] = [np.load(io.BytesIO(c)) for c in valores]
+        elif nome in ["cerebro1", "cerebro2"]:
+            tabela[nome] = [desserializa_cerebro(c) for c in valores]
+        elif nome != "parametros":
+            tabela[nome] = np.array(valores)
+
+    parametros = [json.loads(linha[1]) for linha in linhas]
+    for nome in sorted({nome for p in parametros for nome in p}):
+        tabela[nome] = np.array([p.get(nome) for p in parametros])
+
+    for nome in ["vitorias1", "vitorias2", "empates"]:
+        tabela[f"taxa_{nome}"] = tabela[nome] / tabela["num_jogos"]
+
+    return tabela
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--grade", required=True, help="grade em JSON")
+    parser.add_argument("--sementes", type=int, default=3)
+    parser.add_argument("--jogos", type=int, default=10000)
+    parser.add_argument(
+        "--lote",
+        type=int,
+        default=0,
+        help="reforça a cada LOTE jogos (mais rápido, mas é outra regra de "
+        "aprendizado); 0 reforça a cada jogo",
+    )
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--saida", default="varredura.sqlite")
+    parser.add_argument(
+        "--convergencia",
+        default=None,
+        help='argumentos da Convergencia em JSON, ex.: {"janela": 2000}',
+    )
+    args = parser.parse_args()
+
+    varredura(
+        json.loads(args.grade),
+        args.sementes,
+        args.jogos,
+        args.saida,
+        args.lote or None,
+        args.processos,
+        convergencia=(
+            None
+            if args.convergencia is None
+            else json.loads(args.convergencia)
+        ),
+    )
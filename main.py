@@ -4,20 +4,50 @@ a biblioteca pygame.
 
 :)
 """
-import pygame, sys
+import argparse, os, pygame, sys, tempfile
+
+# Modo headless (python main.py --headless JOGOS): sem janela nem som, um robô
+# joga as partidas o mais rápido possível e um relatório é impresso no fim.
+parser = argparse.ArgumentParser(description="MENACE")
+parser.add_argument("--headless", type=int, metavar="JOGOS")
+parser.add_argument("--semente", type=int, default=None)
+parser.add_argument("--animacoes", action="store_true", help="não pula")
+parser.add_argument("--instrumentar", action="store_true")
+parser.add_argument(
+    "--recuperar",
+    action="store_true",
+    help="continua o cérebro da última sessão (checkpoint e diário)",
+)
+args = parser.parse_args()
+HEADLESS = args.headless is not None
+if HEADLESS:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
 from files.gui import *
 from files.api import *
 
 RUNNING = True
 FPS = 60
 PAUSADO = [False, False]
-LOADING = False
+LOADING = args.recuperar
+
+if HEADLESS:
+    # sem limite de quadros e sem mexer nos arquivos do jogo de verdade
+    FPS = 0
+    LOADING = False
+    pasta_headless = tempfile.mkdtemp(prefix="menace_headless_")
+    brain_save_path = os.path.join(pasta_headless, "brain.npz")
+    games_log_path = os.path.join(pasta_headless, "partidas.bin")
+    instrumentation_path = os.path.join(pasta_headless, "instrumentacao.json")
 
 
 # ------------------------------------ Configurações iniciais
 pygame.init()
-clock = pygame.time.Clock()
-pygame.event.set_allowed([pygame.KEYDOWN, pygame.QUIT, pygame.MOUSEBUTTONDOWN])
+ritmo = RitmoAdaptativo(FPS)
+pygame.event.set_allowed(
+    [pygame.KEYDOWN, pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION]
+)
 font = pygame.font.Font("files/assets/basis33.ttf", 50)
 lista_konami = ["0" for _ in range(10)]
 
@@ -28,15 +58,15 @@ screen = pygame.display.set_mode(
 pygame.display.set_caption("MENACE")
 icon = pygame.image.load("files/assets/icon.png")
 pygame.display.set_icon(icon)
-background = pygame.image.load("files/assets/sprites/bg_colorido.png")
+precarrega_sprites()
+background = pygame.image.load(
+    "files/assets/sprites/bg_colorido.png"
+).convert()
 background = pygame.transform.scale_by(background, scale_factor)
 pygame.mouse.set_visible(False)
 
-# Placar:
-vitorias_jogador = [0]
-vitorias_menace = [0]
-empates = [0]
-lista_de_listas = [vitorias_jogador, vitorias_menace, empates]
+# Placar (vitórias do jogador, vitórias do MENACE e empates):
+historico = Historico(codigos=CODIGOS_ADVERSARIO)
 
 
 # ------------------------------------ Instâncias e objetos
@@ -47,15 +77,16 @@ player = Player(isX_constant, (100, 100))
 Player_group.add(player)
 
 # Menace:
-menace = Menace(not player.isX)
-if LOADING:
-    menace.load_pickles(lista_de_listas)
+registro_partidas = RegistroPartidas(games_log_path)
+menace = Menace(not player.isX, registro=registro_partidas)
+# Checkpoints e diário do cérebro (com --recuperar, continua a última sessão):
+menace.abrir_diario(historico, recuperar=LOADING, caminho=brain_save_path)
 
 # Animação:
 animacao_group = pygame.sprite.Group()
 proximo_group = pygame.sprite.GroupSingle()
 
-proximo = pygame.sprite.Sprite()
+proximo = pygame.sprite.DirtySprite()
 proximo.image = pygame.image.load(
     "files/assets/sprites/spr_proximo.png"
 ).convert_alpha()
@@ -78,14 +109,36 @@ for i in range(9):
     prob_nova = Probabilidades("0%", i + 1, screen, font)
     prob_group.add(prob_nova)
 
+# Tela (só redesenha o que mudou desde o último frame):
+tela = pygame.sprite.LayeredDirty()
+tela.add(caixinhas_group.sprites(), prob_group.sprites(), layer=0)
+tela.add(proximo, layer=1)
+tela.add(player, layer=2)
+fundo_preto = pygame.Surface((DISPLAY_W, DISPLAY_H))
+fundo_atual = None
+
+# Instrumentação (tecla I mostra o painel):
+instrumentacao = Instrumentacao(
+    pygame.font.Font("files/assets/basis33.ttf", 24), args.instrumentar
+)
+menace.instrumentacao = instrumentacao
+tela.add(instrumentacao, layer=3)
+
+# Robô do modo headless:
+if HEADLESS:
+    robo = Robo(args.headless, historico, args.semente, not args.animacoes)
+
 
 # ------------------------------------ Loop do jogo
 while RUNNING:
-    events = pygame.event.get()
+    if HEADLESS:
+        events = robo.eventos(caixinhas_group, animacao_group, PAUSADO)
+    else:
+        events = ritmo.eventos()
+    instrumentacao.inicio_quadro(events)
 
     lista_konami = konami(events, lista_konami)
     if lista_konami == True:
-        menace.save_pickles(lista_de_listas)
         RUNNING = False
 
     # Checagem de eventos:
@@ -94,13 +147,23 @@ while RUNNING:
             # Print brain (P)
             if event.key == pygame.K_p:
                 print(menace.menace.brain)
+            # Print taxa de quadros (F)
+            if event.key == pygame.K_f:
+                fps, ocioso = ritmo.fps_efetivo()
+                print(
+                    f"FPS efetivo: {fps:.1f} "
+                    f"({ocioso:.0%} do tempo esperando eventos)"
+                )
+            # Painel de instrumentação (I)
+            if event.key == pygame.K_i:
+                instrumentacao.alterna()
             # Print histórico (H)
             if event.key == pygame.K_h:
                 print(
                     f"------------------------ \
-\n Vitórias do jogador: {lista_de_listas[0][-1]} \n \
-\n Vitórias do MENACE: {lista_de_listas[1][-1]} \n \
-\n Empates: {lista_de_listas[2][-1]} \n \
+\n Vitórias do jogador: {historico.totais()[0]} \n \
+\n Vitórias do MENACE: {historico.totais()[1]} \n \
+\n Empates: {historico.totais()[2]} \n \
 ------------------------"
                 )
             # Recomeçar partida atual (R)
@@ -120,6 +183,8 @@ while RUNNING:
                     reset_game(caixinhas_group)
                 mixer.stop()
 
+    instrumentacao.marca("eventos")
+
     if PAUSADO[1]:
         PAUSADO[1] -= 1
         if not PAUSADO[1]:
@@ -132,46 +197,69 @@ while RUNNING:
     ):
         menace.jogada(
             caixinhas_group,
-            lista_de_listas,
+            historico,
             animacao_group,
             PAUSADO,
             prob_group,
         )
+    instrumentacao.marca("menace começa")
 
     # Updates:
     if (not PAUSADO[0]) or (PAUSADO[1]):
-        screen.blit(background, (0, 0))
-
-        caixinhas_group.draw(screen)
         caixinhas_group.update(
             events,
             menace,
             caixinhas_group,
-            lista_de_listas,
+            historico,
             animacao_group,
             PAUSADO,
             prob_group,
         )
 
-    if ((len(animacao_group) != 0) or (PAUSADO[0])) and (not PAUSADO[1]):
-        screen.fill((0, 0, 0))
-    if ((len(animacao_group) == 0) and (PAUSADO[0])) and (not PAUSADO[1]):
-        proximo_group.draw(screen)
-
-    if (not PAUSADO[0]) or (PAUSADO[1]):
-        prob_group.draw(screen)
-        prob_group.update()
-
         if len(animacao_group) == 0:
-            Player_group.draw(screen)
             Player_group.update()
 
-    animacao_group.draw(screen)
     animacao_group.update()
+    instrumentacao.marca("updates")
+
+    # Desenho:
+    tela_preta = ((len(animacao_group) != 0) or (PAUSADO[0])) and (
+        not PAUSADO[1]
+    )
+    fundo = fundo_preto if tela_preta else background
+    if fundo is not fundo_atual:
+        tela.clear(screen, fundo)
+        tela.repaint_rect(screen.get_rect())
+        fundo_atual = fundo
+
+    for sprite in tela.get_sprites_from_layer(1):
+        if sprite is not proximo and sprite not in animacao_group:
+            tela.remove(sprite)
+    tela.add(animacao_group.sprites(), layer=1)
+
+    mostrar(caixinhas_group, not tela_preta)
+    mostrar(prob_group, not tela_preta)
+    mostrar(Player_group, not tela_preta and len(animacao_group) == 0)
+    mostrar(proximo_group, tela_preta and len(animacao_group) == 0)
+
+    rects = tela.draw(screen)
+    instrumentacao.marca("desenho")
+    pygame.display.update(rects)
+    instrumentacao.marca("display")
+    instrumentacao.fim_quadro()
 
-    pygame.display.update()
-    clock.tick(FPS)
+    # Sem animação nem contagem, nada muda até o próximo evento:
+    ritmo.tick(
+        (len(animacao_group) == 0) and (not PAUSADO[1]) and not HEADLESS
+    )
 
 # Fecha loop do jogo:
+if instrumentacao.ativa:
+    instrumentacao.exporta(instrumentation_path)
+menace.fechar_diario()
+registro_partidas.fechar()
+if HEADLESS:
+    print(robo.relatorio())
+    print(f"Cérebro e partidas da sessão em {pasta_headless}")
 pygame.quit()
 sys.exit()